@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of :py:func:`~.feedin.form_feedin_for_deflex`.
+
+Compares the pivot based function with the former implementation, which
+filtered the whole feed-in for every (nuts, technology) pair and added the
+columns one by one.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import timeit
+import warnings
+
+import pandas as pd
+
+from feedin_germany import feedin as f
+from feedin_germany.benchmarks import synthetic
+
+
+def form_feedin_for_deflex_loop(feedin):
+    r"""
+    Former implementation of :py:func:`~.feedin.form_feedin_for_deflex`.
+
+    """
+    cols = pd.MultiIndex(levels=[[], []], codes=[[], []])
+    deflex_feedin = pd.DataFrame(columns=cols)
+    filter_df = feedin.groupby(['nuts', 'technology']).size().reset_index(
+        ).drop(columns=[0], axis=1)
+    for filters in filter_df.values:
+        df = feedin.loc[(feedin['nuts'] == filters[0]) &
+                        (feedin['technology'] == filters[1])].drop(
+            columns=['nuts', 'technology']).set_index('time')
+        deflex_feedin[filters[0], filters[1].lower()] = df['feedin']
+    return deflex_feedin
+
+
+def run(n_regions=400, n_hours=8760, repeat=1):
+    feedin = synthetic.create_feedin(n_regions=n_regions, n_hours=n_hours)
+    results = {}
+    for name, func in [('loop', form_feedin_for_deflex_loop),
+                       ('pivot', f.form_feedin_for_deflex)]:
+        results[name] = min(timeit.repeat(lambda: func(feedin), number=1,
+                                          repeat=repeat))
+    return results
+
+
+if __name__ == "__main__":
+    # the former implementation fragments the data frame on purpose
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+    # the former implementation needs more than 15 minutes for 400 regions
+    for n_regions in [10, 50, 100]:
+        times = run(n_regions=n_regions)
+        print("{} regions x 3 technologies x 8760 h: loop {:.2f} s, "
+              "pivot {:.2f} s, speedup {:.0f}x".format(
+                n_regions, times['loop'], times['pivot'],
+                times['loop'] / times['pivot']))
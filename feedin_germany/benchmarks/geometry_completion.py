@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of :py:func:`~.opsd_power_plants.complete_opsd_geometries`.
+
+Times the utm conversion, the postcode lookup and the federal state fallback
+on a synthetic register with missing coordinates and compares them with the
+former implementations, which looped over the utm zones, the postcodes and
+the power plants row by row. The former postcode lookup scans the whole
+register for every power plant and is therefore only timed for the smallest
+size.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import os
+import logging
+import tempfile
+import timeit
+
+import pandas as pd
+import pyproj
+from shapely.wkt import loads as wkt_loads
+
+from feedin_germany import config as cfg
+from feedin_germany import opsd_power_plants as opsd
+from feedin_germany.benchmarks import synthetic
+
+
+def convert_utm_code_opsd_loop(df):
+    r"""
+    Former implementation of
+    :py:func:`~.opsd_power_plants.convert_utm_code_opsd`.
+
+    """
+    utm_zones = list()
+    if 'utm_zone' in df:
+        df_utm = df.loc[(df.lon.isnull()) & (df.utm_zone.notnull())]
+        utm_zones = df_utm.utm_zone.unique()
+    for zone in utm_zones:
+        my_utm = pyproj.Proj(
+            "+proj=utm +zone={0} +north +ellps=WGS84 ".format(str(int(zone))) +
+            "+datum=WGS84 +units=m +no_defs")
+        utm_df = df_utm.loc[df_utm.utm_zone == int(zone),
+                            ('utm_east', 'utm_north')]
+        coord = my_utm(utm_df.utm_east.values, utm_df.utm_north.values,
+                       inverse=True)
+        df.loc[(df.lon.isnull()) & (df.utm_zone == int(zone)), 'lat'] = (
+            coord[1])
+        df.loc[(df.lon.isnull()) & (df.utm_zone == int(zone)), 'lon'] = (
+            coord[0])
+    return df
+
+
+def guess_coordinates_by_postcode_opsd_loop(df):
+    r"""
+    Former implementation of
+    :py:func:`~.opsd_power_plants.guess_coordinates_by_postcode_opsd`.
+
+    """
+    df_pstc = df.loc[(df.lon.isnull() & df.postcode.notnull())]
+    pstc = pd.read_csv(os.path.join(
+        os.path.dirname(opsd.__file__), cfg.get('paths', 'geometry'),
+        cfg.get('geometry', 'postcode_polygon')), index_col='zip_code')
+    for idx, val in df_pstc.iterrows():
+        try:
+            postcode = int(val.postcode)
+            if postcode not in pstc.index:
+                postcode = round(postcode / 10) * 10
+            if postcode in pstc.index:
+                df.loc[df.id == val.id, 'lon'] = wkt_loads(
+                    pstc.loc[postcode].values[0]).centroid.x
+                df.loc[df.id == val.id, 'lat'] = wkt_loads(
+                    pstc.loc[postcode].values[0]).centroid.y
+        except ValueError:
+            pass
+    return df
+
+
+def guess_coordinates_by_federal_state_loop(df, fs_column='state'):
+    r"""
+    Former federal state fallback of
+    :py:func:`~.opsd_power_plants.guess_coordinates_by_spatial_names_opsd`.
+
+    """
+    f2c = pd.read_csv(os.path.join(
+        os.path.dirname(opsd.__file__), cfg.get('paths', 'geometry'),
+        cfg.get('geometry', 'federalstates_centroid')), index_col='name')
+    f2c = f2c.iloc[:, 0].apply(wkt_loads).apply(lambda g: g.centroid)
+    for l in df.loc[(df.lon.isnull() & df[fs_column].notnull())].index:
+        if df.loc[l, fs_column] in f2c.index:
+            df.loc[l, 'lon'] = f2c[df.loc[l, fs_column]].x
+            df.loc[l, 'lat'] = f2c[df.loc[l, fs_column]].y
+    return df
+
+
+def guess_coordinates_by_federal_state(df, fs_column='state'):
+    return opsd.guess_coordinates_by_spatial_names_opsd(
+        df, fs_column, 'capacity', df['capacity'].sum(), pd.DataFrame())
+
+
+def prepare_geometry_files(path, postcodes):
+    r"""
+    Writes synthetic postcode and federal state files to `path` and sets the
+    geometry and message directories in the configuration to `path`.
+
+    """
+    postcodes.to_csv(os.path.join(path, 'postcodes.csv'), index=False)
+    synthetic.create_federal_states().to_csv(
+        os.path.join(path, 'federal_states.csv'), index=False)
+    cfg.config.set('paths', 'geometry', path)
+    cfg.config.set('paths', 'messages', path)
+    cfg.config.set('geometry', 'postcode_polygon', 'postcodes.csv')
+    cfg.config.set('geometry', 'federalstates_centroid', 'federal_states.csv')
+
+
+def run(n_plants=200000, n_missing=100000, former=True, repeat=3):
+    r"""
+    Times the steps of the geometry completion.
+
+    Parameters
+    ----------
+    n_plants : int
+        Number of power plants. Default: 200000.
+    n_missing : int
+        Number of power plants without coordinates. Default: 100000.
+    former : boolean
+        If True the former implementations are timed as well. The former
+        postcode lookup is very slow for large registers. Default: True.
+    repeat : int
+        Number of runs of each step. The minimum is recorded. Default: 3.
+
+    Returns
+    -------
+    results : dict
+        Run time in s (values) of each step and implementation (keys).
+
+    """
+    postcodes = synthetic.create_postcode_polygons()
+    register = synthetic.create_incomplete_register(
+        n_plants, n_missing, postcodes=postcodes)
+    # the input of each step is the output of the step before
+    utm_done = opsd.convert_utm_code_opsd(register.copy())
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        prepare_geometry_files(path, postcodes)
+        # the postcode centroids are cached on the first call
+        postcode_done = opsd.guess_coordinates_by_postcode_opsd(
+            utm_done.copy())
+        steps = [
+            ('utm', register, opsd.convert_utm_code_opsd,
+             convert_utm_code_opsd_loop),
+            ('postcode', utm_done, opsd.guess_coordinates_by_postcode_opsd,
+             guess_coordinates_by_postcode_opsd_loop),
+            ('federal_state', postcode_done,
+             guess_coordinates_by_federal_state,
+             guess_coordinates_by_federal_state_loop)]
+        for step, df, func, former_func in steps:
+            results[step] = min(timeit.repeat(
+                lambda: func(df.copy()), number=1, repeat=repeat))
+            if former:
+                results[step + '_former'] = min(timeit.repeat(
+                    lambda: former_func(df.copy()), number=1, repeat=1))
+        results['complete_opsd_geometries'] = min(timeit.repeat(
+            lambda: opsd.complete_opsd_geometries(register.copy(),
+                                                  fs_column='state'),
+            number=1, repeat=repeat))
+    return results
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    for n_missing, former in [(10000, True), (100000, False)]:
+        times = run(n_plants=2 * n_missing, n_missing=n_missing,
+                    former=former)
+        for step, seconds in times.items():
+            print("{} missing: {:<30} {:8.3f} s".format(n_missing, step,
+                                                        seconds))
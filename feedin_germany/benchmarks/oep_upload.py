@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the upload of feed-in time series to the OEP.
+
+The upload goes to the local stand-in server
+feedin_germany/examples_and_testing/oep_stand_in_server.py, which is started
+in a separate process and delays every request to simulate the network
+latency. One request per region (as before
+:py:class:`~.oep_upload.OEPUploader` was introduced) is compared with chunked
+concurrent uploads.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import os
+import subprocess
+import sys
+import time
+
+from feedin_germany import oep_upload
+from feedin_germany.benchmarks import synthetic
+
+
+def start_stand_in_server(port, latency, fail_every):
+    filename = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                            'examples_and_testing', 'oep_stand_in_server.py')
+    process = subprocess.Popen(
+        [sys.executable, filename, '--port', str(port), '--latency',
+         str(latency), '--fail-every', str(fail_every)],
+        stdout=subprocess.PIPE)
+    # wait until the server is running
+    url = process.stdout.readline().decode().split()[-1]
+    return process, url
+
+
+def upload(feedin, url, chunk_size, max_workers):
+    uploader = oep_upload.OEPUploader(
+        url=url, schema='model_draft', table='benchmark', token='test',
+        chunk_size=chunk_size, max_workers=max_workers, max_retries=3,
+        backoff=0.01)
+    start = time.perf_counter()
+    for (nuts, technology), df in feedin.groupby(['nuts', 'technology'],
+                                                 sort=False):
+        uploader.write(df, year=2012, technology=technology, nuts=nuts)
+    uploader.close()
+    assert uploader.uploaded_rows == len(feedin)
+    return time.perf_counter() - start
+
+
+def run(n_regions=50, latency=0.2, fail_every=0, port=8765):
+    feedin = synthetic.create_feedin(n_regions=n_regions,
+                                     technologies=('Wind',))
+    process, url = start_stand_in_server(port, latency, fail_every)
+    try:
+        results = {
+            'per region': upload(feedin, url, chunk_size=8760,
+                                 max_workers=1),
+            'chunked, 1 worker': upload(feedin, url, chunk_size=43800,
+                                        max_workers=1),
+            'chunked, 4 workers': upload(feedin, url, chunk_size=43800,
+                                         max_workers=4)}
+    finally:
+        process.terminate()
+        process.wait()
+    return len(feedin), results
+
+
+if __name__ == "__main__":
+    n_rows, results = run(fail_every=7)
+    for name, seconds in results.items():
+        print("{}: {:.2f} s ({:.0f} rows/s)".format(
+            name, seconds, n_rows / seconds))
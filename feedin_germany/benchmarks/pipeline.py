@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the stages of the feed-in calculation with synthetic inputs.
+
+The stages :py:func:`~.opsd_power_plants.assign_turbine_data_by_wind_zone`,
+:py:func:`~.oep_regions.add_region_to_register`,
+:py:func:`~.power_plant_register_tools.get_pp_by_year`,
+:py:func:`~.feedin.calculate_feedin` and
+:py:func:`~.feedin.form_feedin_for_deflex` are timed at several sizes without
+local files or network data (see :py:mod:`~.benchmarks.synthetic`).
+:py:func:`~.feedin.calculate_feedin` is only timed with `--online`, as the
+model chains of the feedinlib and the windpowerlib fetch turbine data from the
+oedb; otherwise :py:func:`~.feedin.form_feedin_for_deflex` is timed with
+synthetic feed-in.
+
+The results are appended to a json lines file in the current working directory
+together with the current git commit, so that the results of different commits
+can be compared with :py:func:`compare`::
+
+    python -m feedin_germany.benchmarks.pipeline --sizes small medium
+    python -m feedin_germany.benchmarks.pipeline --online --method profiles
+    python -m feedin_germany.benchmarks.pipeline --compare <commit> <commit>
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+import pandas as pd
+
+from feedin_germany import config as cfg
+from feedin_germany import feedin as f
+from feedin_germany import oep_regions as oep
+from feedin_germany import opsd_power_plants as opsd
+from feedin_germany import power_plant_register_tools as ppr_tools
+from feedin_germany import weather
+from feedin_germany.benchmarks import synthetic
+
+
+# number of power plants, regions and hours and weather resolution in degrees
+SIZES = {
+    'small': dict(n_plants=1000, n_regions=20, n_hours=168, resolution=1.),
+    'medium': dict(n_plants=30000, n_regions=100, n_hours=8760,
+                   resolution=0.5),
+    'large': dict(n_plants=300000, n_regions=401, n_hours=8760,
+                  resolution=0.25)}
+
+# file the results are appended to, relative to the current working directory
+RESULTS_FILE = 'pipeline_results.jsonl'
+
+YEAR = 2012
+
+
+@contextlib.contextmanager
+def prepare_weather_store(category, weather_df, path):
+    r"""
+    Writes synthetic weather data to the weather store used by
+    :py:func:`~.feedin.calculate_feedin`.
+
+    The weather directory and the open_FRED file of `category` in the
+    configuration are set to `path` within the block and restored afterwards.
+
+    """
+    filename = os.path.join(path, 'open_fred_{}.csv'.format(
+        category.lower()))
+    open(filename, 'w').close()
+    options = [('paths', 'weather', path),
+               ('weather', 'open_fred_{}'.format(category.lower()), filename)]
+    old_values = [cfg.config.get(section, option, fallback=None)
+                  for section, option, value in options]
+    try:
+        for section, option, value in options:
+            cfg.config.set(section, option, value)
+        weather.write_weather_store(weather_df, weather.get_weather_store_path(
+            category, YEAR, filename=filename))
+        yield
+    finally:
+        for (section, option, value), old_value in zip(options, old_values):
+            if old_value is None:
+                cfg.config.remove_option(section, option)
+            else:
+                cfg.config.set(section, option, old_value)
+
+
+def time_function(func, repeat):
+    r"""
+    Returns the minimum run time of `func` in s of `repeat` runs.
+
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run(size='small', repeat=3, method='profiles', seed=0, online=False):
+    r"""
+    Times the stages of the feed-in calculation of wind power plants.
+
+    Parameters
+    ----------
+    size : string
+        Size of the inputs. Options: keys of :py:attr:`SIZES`.
+        Default: 'small'.
+    repeat : int
+        Number of runs of each stage. The minimum is recorded. Default: 3.
+    method : string
+        Calculation method of :py:func:`~.feedin.calculate_feedin`.
+        Default: 'profiles'.
+    seed : int
+        Seed of the random number generator. Default: 0.
+    online : boolean
+        If True :py:func:`~.feedin.calculate_feedin` is timed, which fetches
+        turbine data from the oedb. Otherwise the stage is skipped and
+        synthetic feed-in is formed for deflex (see
+        :py:func:`~.benchmarks.synthetic.create_feedin`). Default: False.
+
+    Returns
+    -------
+    results : dict
+        Run time in s (values) of each stage (keys).
+
+    """
+    params = SIZES[size]
+    register = synthetic.create_register(
+        n_plants=params['n_plants'], n_regions=params['n_regions'],
+        seed=seed).drop(columns='nuts')
+    regions = synthetic.create_regions(n_regions=params['n_regions'],
+                                       seed=seed)
+    wind_zones = synthetic.create_wind_zones()
+    weather_df = synthetic.create_weather(
+        'Wind', n_hours=params['n_hours'], resolution=params['resolution'],
+        year=YEAR, seed=seed)
+
+    # the stages are run in the order of calculate_feedin_germany(); the
+    # functions add columns to their input, therefore they get a copy
+    results = {}
+    results['assign_turbine_data_by_wind_zone'] = time_function(
+        lambda: opsd.assign_turbine_data_by_wind_zone(
+            register.copy(), wind_zones=wind_zones), repeat)
+    register = opsd.assign_turbine_data_by_wind_zone(register.copy(),
+                                                     wind_zones=wind_zones)
+    results['add_region_to_register'] = time_function(
+        lambda: oep.add_region_to_register(register.copy(), regions), repeat)
+    register = pd.DataFrame(oep.add_region_to_register(register.copy(),
+                                                       regions))
+    results['get_pp_by_year'] = time_function(
+        lambda: ppr_tools.get_pp_by_year(year=YEAR, register=register),
+        repeat)
+    register = ppr_tools.get_pp_by_year(year=YEAR, register=register).drop(
+        columns=ppr_tools.DATE_COLUMNS)
+
+    if not online:
+        feedin = synthetic.create_feedin(
+            n_regions=params['n_regions'], technologies=('Wind',),
+            n_hours=params['n_hours'], year=YEAR, seed=seed)
+        results['form_feedin_for_deflex'] = time_function(
+            lambda: f.form_feedin_for_deflex(feedin), repeat)
+        return results
+    with tempfile.TemporaryDirectory() as path, prepare_weather_store(
+            'Wind', weather_df, path):
+        results['calculate_feedin'] = time_function(
+            lambda: f.calculate_feedin(
+                year=YEAR, register=register, regions=regions,
+                category='Wind', return_feedin=True, method=method), repeat)
+        feedin = f.calculate_feedin(
+            year=YEAR, register=register, regions=regions, category='Wind',
+            return_feedin=True, method=method)
+    results['form_feedin_for_deflex'] = time_function(
+        lambda: f.form_feedin_for_deflex(feedin), repeat)
+    return results
+
+
+def get_commit():
+    r"""
+    Returns the current git commit and whether the tree has changes.
+
+    """
+    cwd = os.path.dirname(__file__)
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd).decode().strip()
+        dirty = bool(subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=cwd).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def record(results, size, method='profiles', online=False,
+           filename=RESULTS_FILE):
+    r"""
+    Appends the results of :py:func:`run` to the json lines file `filename`.
+
+    """
+    commit, dirty = get_commit()
+    with open(filename, 'a') as file:
+        for stage, seconds in results.items():
+            file.write(json.dumps({
+                'commit': commit, 'dirty': dirty,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': sys.version.split()[0], 'pandas': pd.__version__,
+                'size': size, 'method': method, 'online': online,
+                'stage': stage,
+                'seconds': seconds, **SIZES[size]}) + '\n')
+
+
+def load_results(filename=RESULTS_FILE):
+    r"""
+    Loads the recorded results.
+
+    """
+    return pd.read_json(filename, lines=True, dtype={'commit': str})
+
+
+def compare(base, head, filename=RESULTS_FILE):
+    r"""
+    Compares the recorded results of two commits.
+
+    Parameters
+    ----------
+    base : string
+        Commit the results are compared to.
+    head : string
+        Commit whose results are compared.
+    filename : string
+        Json lines file with the results. Default: :py:attr:`RESULTS_FILE`.
+
+    Returns
+    -------
+    comparison : pd.DataFrame
+        Latest run time in s of each size, method and stage of both commits
+        and the ratio head / base.
+
+    """
+    results = load_results(filename)
+    times = results.loc[results['commit'].isin([base, head])].groupby(
+        ['size', 'method', 'stage', 'commit'])['seconds'].last().unstack(
+        'commit')
+    comparison = times.reindex(columns=[base, head])
+    comparison['ratio'] = comparison[head] / comparison[base]
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'],
+                        choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--method', default='profiles',
+                        choices=['region', 'profiles'])
+    parser.add_argument('--online', action='store_true',
+                        help="time calculate_feedin(), which fetches turbine "
+                             "data from the oedb")
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'))
+    args = parser.parse_args()
+    if args.compare:
+        print(compare(*args.compare, filename=args.output))
+    else:
+        for size in args.sizes:
+            results = run(size=size, repeat=args.repeat, method=args.method,
+                          online=args.online)
+            record(results, size=size, method=args.method,
+                   online=args.online, filename=args.output)
+            for stage, seconds in results.items():
+                print("{:<8} {:<34} {:8.3f} s".format(size, stage, seconds))
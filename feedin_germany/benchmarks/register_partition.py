@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of selecting the power plants of each region from a register.
+
+Compares filtering the whole register for every region (as done before
+:py:func:`~.power_plant_register_tools.partition_register` was introduced)
+with partitioning the register once.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import timeit
+
+from feedin_germany import power_plant_register_tools as ppr_tools
+from feedin_germany.benchmarks import synthetic
+
+
+def select_by_mask(register, nuts):
+    return {nut: register.loc[register['nuts'] == nut] for nut in nuts}
+
+
+def select_by_partition(register, nuts):
+    partitions = ppr_tools.partition_register(register, column='nuts')
+    return {nut: partitions.get(nut) for nut in nuts}
+
+
+def run(n_plants=1500000, n_regions=401, number=1):
+    register = synthetic.create_register(n_plants=n_plants,
+                                         n_regions=n_regions)
+    nuts = register['nuts'].unique()
+    results = {}
+    for name, func in [('mask', select_by_mask),
+                       ('partition', select_by_partition)]:
+        results[name] = min(timeit.repeat(
+            lambda: func(register, nuts), number=number, repeat=3)) / number
+    return results
+
+
+if __name__ == "__main__":
+    for n_plants in [30000, 1500000]:
+        times = run(n_plants=n_plants)
+        print("{} plants, 401 regions: mask {:.3f} s, partition {:.3f} s, "
+              "speedup {:.1f}x".format(n_plants, times['mask'],
+                                       times['partition'],
+                                       times['mask'] / times['partition']))
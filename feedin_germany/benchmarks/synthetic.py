@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+The `synthetic` module contains functions for creating synthetic input data
+of the size of German power plant registers for benchmarks: OPSD-like power
+plant registers, Landkreis-like region polygons, wind zones, open_FRED-like
+weather data and postcode and federal state geometries.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Polygon, box
+
+
+# bounding box of Germany (lon_min, lat_min, lon_max, lat_max)
+GERMANY_BOUNDS = (5.9, 47.3, 15.0, 55.0)
+
+
+def create_register(n_plants, n_regions, seed=0):
+    r"""
+    Creates a synthetic OPSD-like power plant register.
+
+    Parameters
+    ----------
+    n_plants : int
+        Number of power plants.
+    n_regions : int
+        Number of regions the power plants are distributed to. The region of
+        each power plant is given in column 'nuts'.
+    seed : int
+        Seed of the random number generator. Default: 0.
+
+    Returns
+    -------
+    register : pd.DataFrame
+        Contains the columns 'lat', 'lon', 'capacity' (in W),
+        'commissioning_date', 'com_year', 'decom_year', 'com_month',
+        'decom_month' and 'nuts'.
+
+    """
+    rng = np.random.RandomState(seed)
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    com_year = rng.randint(1990, 2018, n_plants)
+    com_month = rng.randint(1, 13, n_plants)
+    register = pd.DataFrame({
+        'lat': rng.uniform(lat_min, lat_max, n_plants),
+        'lon': rng.uniform(lon_min, lon_max, n_plants),
+        'capacity': rng.lognormal(11., 1.5, n_plants).round(),
+        'commissioning_date': pd.to_datetime(pd.DataFrame(
+            {'year': com_year, 'month': com_month, 'day': 1})).dt.strftime(
+            '%Y-%m-%d'),
+        'com_year': com_year,
+        'decom_year': 2050,
+        'com_month': com_month,
+        'decom_month': 12,
+        'nuts': np.char.add(
+            'DE', rng.randint(0, n_regions, n_plants).astype(str))})
+    return register
+
+
+def create_regions(n_regions, n_vertices=100, seed=0):
+    r"""
+    Creates Landkreis-like region polygons covering Germany's bounding box.
+
+    The bounding box is divided into a grid of about `n_regions` cells. The
+    edges of the cells are jagged with `n_vertices` vertices each, so that
+    the polygons have about as many vertices as real district borders.
+
+    Parameters
+    ----------
+    n_regions : int
+        Approximate number of regions. The number of rows and columns of the
+        grid is chosen so that there are at least `n_regions` regions.
+    n_vertices : int
+        Number of vertices per edge of a region. Default: 100.
+    seed : int
+        Seed of the random number generator. Default: 0.
+
+    Returns
+    -------
+    regions : geopandas.GeoDataFrame
+        Regions with nuts in column 'nuts' (as in :py:func:`create_register`)
+        and geometry in column 'geom'.
+
+    """
+    rng = np.random.RandomState(seed)
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    n_cols = int(np.ceil(np.sqrt(n_regions)))
+    n_rows = int(np.ceil(n_regions / n_cols))
+    lons = np.linspace(lon_min, lon_max, n_cols + 1)
+    lats = np.linspace(lat_min, lat_max, n_rows + 1)
+    amplitude = 0.1 * min(lons[1] - lons[0], lats[1] - lats[0])
+    # jagged horizontal and vertical borders shared by neighbouring regions,
+    # the corners of the grid are kept
+    steps = np.linspace(0, 1, n_vertices + 1)
+    offsets = rng.uniform(-amplitude, amplitude, (2, max(n_rows, n_cols) + 1,
+                                                  max(n_rows, n_cols),
+                                                  n_vertices + 1))
+    # the offsets decrease towards the corners, so that the borders do not
+    # cross, and the outer borders are straight
+    offsets *= np.sin(np.pi * steps)
+    offsets[0, [0, n_rows]] = 0
+    offsets[1, [0, n_cols]] = 0
+
+    def horizontal(row, col):
+        return np.column_stack([
+            lons[col] + steps * (lons[col + 1] - lons[col]),
+            lats[row] + offsets[0, row, col]])
+
+    def vertical(row, col):
+        return np.column_stack([
+            lons[col] + offsets[1, col, row],
+            lats[row] + steps * (lats[row + 1] - lats[row])])
+
+    nuts, geoms = [], []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            # outline counter-clockwise: bottom, right, top, left
+            outline = np.concatenate([
+                horizontal(row, col), vertical(row, col + 1),
+                horizontal(row + 1, col)[::-1], vertical(row, col)[::-1]])
+            nuts.append('DE{}'.format(len(nuts)))
+            geoms.append(Polygon(outline))
+    return gpd.GeoDataFrame({'nuts': nuts, 'geom': geoms}, geometry='geom')
+
+
+def create_wind_zones():
+    r"""
+    Creates four wind zones as latitude bands of Germany's bounding box.
+
+    Zone 1 (coastal) is in the north, zone 4 (far inland) in the south.
+
+    Returns
+    -------
+    wind_zones : geopandas.GeoDataFrame
+        Wind zones with the number of the zone in column 'zone' as needed by
+        :py:func:`~.opsd_power_plants.assign_turbine_data_by_wind_zone`.
+
+    """
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    # the outer bands are enlarged so that all points are within a zone
+    lats = np.linspace(lat_max, lat_min, 5)
+    lats[0], lats[-1] = lat_max + 1, lat_min - 1
+    return gpd.GeoDataFrame({
+        'zone': [1, 2, 3, 4],
+        'geometry': [box(lon_min - 1, lats[zone], lon_max + 1,
+                         lats[zone - 1]) for zone in [1, 2, 3, 4]]},
+        geometry='geometry')
+
+
+def create_weather(category='Wind', n_hours=8760, resolution=0.5, year=2012,
+                   seed=0):
+    r"""
+    Creates open_FRED-like weather data on a regular grid over Germany.
+
+    Parameters
+    ----------
+    category : string
+        Energy source category the weather data is used for. 'Wind': MultiIndex
+        (time, lat, lon) and columns (variable, height) as needed by the
+        windpowerlib. 'Solar': time index with the location in columns 'lat'
+        and 'lon' as read by :py:func:`~.weather.read_open_fred_csv`.
+        Default: 'Wind'.
+    n_hours : int
+        Number of hourly time steps. Default: 8760.
+    resolution : float
+        Distance of the weather data points in degrees. Default: 0.5.
+    year : int
+        Year of the time index. Default: 2012.
+    seed : int
+        Seed of the random number generator. Default: 0.
+
+    Returns
+    -------
+    weather_df : pd.DataFrame
+        Weather data.
+
+    """
+    rng = np.random.RandomState(seed)
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    lats = np.arange(lat_min, lat_max + resolution, resolution).round(4)
+    lons = np.arange(lon_min, lon_max + resolution, resolution).round(4)
+    time = pd.date_range(str(year), periods=n_hours, freq='H', tz='UTC',
+                         name='time')
+    n_locations = len(lats) * len(lons)
+    n_rows = n_hours * n_locations
+    if category == 'Wind':
+        wind_speed = rng.weibull(2., n_rows) * 7.
+        index = pd.MultiIndex.from_product([time, lats, lons],
+                                           names=['time', 'lat', 'lon'])
+        columns = pd.MultiIndex.from_tuples(
+            [('wind_speed', 10), ('wind_speed', 80), ('temperature', 10),
+             ('pressure', 0), ('roughness_length', 0)],
+            names=['variable_name', 'height'])
+        return pd.DataFrame(np.column_stack([
+            wind_speed, wind_speed * 1.3, rng.normal(283., 8., n_rows),
+            rng.normal(101000., 1000., n_rows),
+            np.full(n_rows, 0.15)]), index=index, columns=columns)
+    elif category == 'Solar':
+        hour = np.repeat(time.hour.values, n_locations)
+        ghi = np.clip(np.sin(np.pi * (hour - 5) / 15.), 0, None) * (
+            rng.uniform(100., 900., n_rows))
+        return pd.DataFrame({
+            'lat': np.tile(np.repeat(lats, len(lons)), n_hours),
+            'lon': np.tile(lons, len(lats) * n_hours),
+            'wind_speed': rng.weibull(2., n_rows) * 4.,
+            'temp_air': rng.normal(10., 8., n_rows),
+            'dhi': 0.4 * ghi, 'dirhi': 0.6 * ghi, 'ghi': ghi},
+            index=np.repeat(time, n_locations))
+    else:
+        raise ValueError("No weather data for category {}. ".format(
+            category) + "Choose from: 'Wind', 'Solar'.")
+
+
+# names of the German federal states as in the OPSD register
+FEDERAL_STATES = [
+    'Baden-Württemberg', 'Bayern', 'Berlin', 'Brandenburg', 'Bremen',
+    'Hamburg', 'Hessen', 'Mecklenburg-Vorpommern', 'Niedersachsen',
+    'Nordrhein-Westfalen', 'Rheinland-Pfalz', 'Saarland', 'Sachsen',
+    'Sachsen-Anhalt', 'Schleswig-Holstein', 'Thüringen']
+
+
+def create_postcode_polygons(n_postcodes=8000, seed=0):
+    r"""
+    Creates a synthetic postcode table like the postcode file in section
+    'geometry' of feedin_germany.ini.
+
+    Returns
+    -------
+    postcodes : pd.DataFrame
+        Contains the columns 'zip_code' and 'geom' (polygons as WKT).
+
+    """
+    rng = np.random.RandomState(seed)
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    zip_codes = np.sort(rng.choice(np.arange(1000, 100000), n_postcodes,
+                                   replace=False))
+    lon = rng.uniform(lon_min, lon_max - 0.1, n_postcodes)
+    lat = rng.uniform(lat_min, lat_max - 0.1, n_postcodes)
+    return pd.DataFrame({
+        'zip_code': zip_codes,
+        'geom': [box(x, y, x + 0.1, y + 0.1).wkt for x, y in zip(lon, lat)]})
+
+
+def create_federal_states():
+    r"""
+    Creates a synthetic federal state table like the federal state file in
+    section 'geometry' of feedin_germany.ini.
+
+    Returns
+    -------
+    federal_states : pd.DataFrame
+        Contains the columns 'name' and 'geom' (polygons as WKT). The states
+        are cells of a grid covering Germany's bounding box.
+
+    """
+    lon_min, lat_min, lon_max, lat_max = GERMANY_BOUNDS
+    width = (lon_max - lon_min) / 4
+    height = (lat_max - lat_min) / 4
+    return pd.DataFrame({
+        'name': FEDERAL_STATES,
+        'geom': [box(lon_min + (i % 4) * width, lat_min + (i // 4) * height,
+                     lon_min + (i % 4 + 1) * width,
+                     lat_min + (i // 4 + 1) * height).wkt
+                 for i in range(len(FEDERAL_STATES))]})
+
+
+def create_incomplete_register(n_plants, n_missing, postcodes=None, seed=0):
+    r"""
+    Creates a synthetic OPSD-like register with missing coordinates.
+
+    A third of the power plants without coordinates has utm coordinates
+    (zones 32 and 33), a third a postcode and the rest only the federal
+    state. A tenth of the postcodes is not in `postcodes`, so that the
+    round-to-tens fallback is used, and some are not numbers.
+
+    Parameters
+    ----------
+    n_plants : int
+        Number of power plants.
+    n_missing : int
+        Number of power plants without coordinates.
+    postcodes : pd.DataFrame or None
+        Postcode table (see :py:func:`create_postcode_polygons`). If None it
+        is created. Default: None.
+    seed : int
+        Seed of the random number generator. Default: 0.
+
+    Returns
+    -------
+    register : pd.DataFrame
+        Contains the columns 'id', 'lat', 'lon', 'capacity', 'utm_zone',
+        'utm_east', 'utm_north', 'postcode' and 'state'.
+
+    """
+    rng = np.random.RandomState(seed)
+    if postcodes is None:
+        postcodes = create_postcode_polygons(seed=seed)
+    register = create_register(n_plants, n_regions=1, seed=seed)[
+        ['lat', 'lon', 'capacity']]
+    register.insert(0, 'id', np.arange(n_plants))
+    register['utm_zone'] = np.nan
+    register['utm_east'] = np.nan
+    register['utm_north'] = np.nan
+    register['postcode'] = rng.choice(postcodes['zip_code'], n_plants).astype(
+        str)
+    register['state'] = rng.choice(FEDERAL_STATES, n_plants)
+    missing = rng.choice(n_plants, n_missing, replace=False)
+    utm, postcode = np.array_split(missing, 3)[:2]
+    # false easting of 500 km at the central meridians 9 (32N) and 15 (33N)
+    zone = np.where(register['lon'].values[utm] < 12., 32, 33)
+    register.loc[utm, 'utm_zone'] = zone
+    register.loc[utm, 'utm_east'] = 500000. + (
+        register['lon'].values[utm] - (zone * 6 - 183)) * 70000.
+    register.loc[utm, 'utm_north'] = register['lat'].values[utm] * 111000.
+    unknown = postcode[::10]
+    register.loc[unknown, 'postcode'] = rng.randint(
+        1000, 100000, len(unknown)).astype(str)
+    register.loc[postcode[1::50], 'postcode'] = '123XX'
+    register.loc[np.setdiff1d(missing, postcode), 'postcode'] = np.nan
+    register.loc[missing, ['lat', 'lon']] = np.nan
+    return register
+
+
+def create_feedin(n_regions, technologies=('Wind', 'Solar', 'Hydro'),
+                  n_hours=8760, year=2012, seed=0):
+    r"""
+    Creates synthetic feed-in in the format of
+    :py:func:`~.feedin.feedin_to_db_format`.
+
+    Parameters
+    ----------
+    n_regions : int
+        Number of regions.
+    technologies : tuple of strings
+        Technologies of the feed-in. Default: ('Wind', 'Solar', 'Hydro').
+    n_hours : int
+        Number of hourly time steps. Default: 8760.
+    year : int
+        Year of the time index. Default: 2012.
+    seed : int
+        Seed of the random number generator. Default: 0.
+
+    Returns
+    -------
+    feedin : pd.DataFrame
+        Contains the columns 'time', 'feedin', 'nuts' and 'technology'.
+
+    """
+    rng = np.random.RandomState(seed)
+    time = pd.date_range(str(year), periods=n_hours, freq='H', name='time')
+    nuts = ['DE{}'.format(i) for i in range(n_regions)]
+    n_series = n_regions * len(technologies)
+    return pd.DataFrame({
+        'time': np.tile(time, n_series),
+        'feedin': rng.uniform(0, 1e8, n_hours * n_series),
+        'nuts': np.repeat(np.tile(nuts, len(technologies)), n_hours),
+        'technology': np.repeat(technologies, n_hours * n_regions)},
+        index=np.tile(np.arange(n_hours), n_series))
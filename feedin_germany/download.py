@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+The `download` module contains functions for downloading files into a local
+cache.
+
+Files are streamed to disk in chunks and stored under their sha256 checksum.
+For every url the checksum of the latest download and the validators of the
+server (ETag and Last-Modified) are kept, so that a file is only downloaded
+again if it changed on the server.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import os
+import json
+import hashlib
+import logging
+
+import requests
+
+# internal imports
+from feedin_germany import config as cfg
+from feedin_germany import file_tools
+
+
+def get_cache_directory():
+    r"""
+    Returns the download cache directory from feedin_germany.ini.
+
+    """
+    return os.path.join(os.path.dirname(__file__),
+                        cfg.get('paths', 'downloads'))
+
+
+def get_url_metadata_filename(url, cache_directory=None):
+    r"""
+    Returns the file containing the metadata of the latest download of `url`.
+
+    """
+    if cache_directory is None:
+        cache_directory = get_cache_directory()
+    return os.path.join(cache_directory, 'urls', '{}.json'.format(
+        hashlib.sha1(url.encode('utf-8')).hexdigest()))
+
+
+def get_blob_filename(checksum, cache_directory=None):
+    r"""
+    Returns the file containing the content with the sha256 `checksum`.
+
+    """
+    if cache_directory is None:
+        cache_directory = get_cache_directory()
+    return os.path.join(cache_directory, 'blobs', checksum[:2], checksum)
+
+
+def load_url_metadata(url, cache_directory=None):
+    r"""
+    Returns the metadata of the latest download of `url`.
+
+    Returns
+    -------
+    metadata : dict or None
+        Contains 'url', 'sha256', 'etag', 'last_modified' and 'size'. None if
+        `url` was not downloaded or its content is missing.
+
+    """
+    filename = get_url_metadata_filename(url, cache_directory)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as f:
+        metadata = json.load(f)
+    if not os.path.isfile(get_blob_filename(metadata['sha256'],
+                                            cache_directory)):
+        return None
+    return metadata
+
+
+def download_file(url, cache_directory=None, revalidate=True,
+                  chunk_size=1024 ** 2, timeout=60, session=None):
+    r"""
+    Downloads `url` into the cache and returns the file name of the content.
+
+    If `url` was downloaded before, the request is conditional (ETag and
+    If-Modified-Since), so that the content is only transferred again if it
+    changed on the server. If the server cannot be reached the cached content
+    is used.
+
+    Parameters
+    ----------
+    url : string
+        Url of the file.
+    cache_directory : string or None
+        Directory of the cache. If None the directory 'downloads' in section
+        'paths' of feedin_germany.ini is used. Default: None.
+    revalidate : boolean
+        If False the cached content is used without asking the server.
+        Default: True.
+    chunk_size : int
+        Number of bytes written at once. Default: 1 MiB.
+    timeout : float
+        Timeout of the connection in s. Default: 60.
+    session : requests.Session or None
+        Session used for the request. Default: None.
+
+    Returns
+    -------
+    filename : string
+        Cached file with the content of `url`.
+
+    """
+    metadata = load_url_metadata(url, cache_directory)
+    if metadata is not None and not revalidate:
+        return get_blob_filename(metadata['sha256'], cache_directory)
+
+    headers = {}
+    if metadata is not None:
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+    get = requests.get if session is None else session.get
+    try:
+        response = get(url, headers=headers, stream=True, timeout=timeout)
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout) as e:
+        if metadata is None:
+            raise
+        logging.warning("{} cannot be reached ({}). ".format(url, e) +
+                        "The cached file is used.")
+        return get_blob_filename(metadata['sha256'], cache_directory)
+
+    with response:
+        if response.status_code == 304 and metadata is not None:
+            logging.info("{} did not change, the cached file is used.".format(
+                url))
+            return get_blob_filename(metadata['sha256'], cache_directory)
+        response.raise_for_status()
+        logging.info("Downloading {}.".format(url))
+        if cache_directory is None:
+            cache_directory = get_cache_directory()
+        os.makedirs(os.path.join(cache_directory, 'blobs'), exist_ok=True)
+        # stream to a temporary file, the checksum is calculated on the way
+        checksum = hashlib.sha256()
+        size = 0
+        tmp_filename = os.path.join(cache_directory, 'blobs', '{}.tmp'.format(
+            hashlib.sha1(url.encode('utf-8')).hexdigest()))
+        try:
+            with open(tmp_filename, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    checksum.update(chunk)
+                    size += len(chunk)
+            filename = get_blob_filename(checksum.hexdigest(),
+                                         cache_directory)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            os.replace(tmp_filename, filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    metadata = {
+        'url': url, 'sha256': checksum.hexdigest(), 'size': size,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')}
+    metadata_filename = get_url_metadata_filename(url, cache_directory)
+    os.makedirs(os.path.dirname(metadata_filename), exist_ok=True)
+    with file_tools.write_atomically(metadata_filename) as tmp_filename:
+        with open(tmp_filename, 'w') as f:
+            json.dump(metadata, f)
+    logging.info("{} MB downloaded from {}.".format(round(size / 1e6, 1), url))
+    return filename
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for a file server like the OPSD data platform.
+
+Serves the files of a directory with ETag and Last-Modified headers and
+answers conditional requests (If-None-Match, If-Modified-Since) with 304, so
+that downloads (see :py:func:`~.download.download_file`) can be tested
+offline. The number of requests and of transferred files is counted.
+
+Usage: python file_stand_in_server.py DIRECTORY [--port PORT]
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FileStandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        filename = os.path.join(self.server.directory,
+                                self.path.split('?')[0].lstrip('/'))
+        with self.server.lock:
+            self.server.requests += 1
+        if not os.path.isfile(filename):
+            return self._respond(404)
+        etag, last_modified = self._get_validators(filename)
+        if self._not_modified(etag, last_modified):
+            return self._respond(304, etag=etag, last_modified=last_modified)
+        with self.server.lock:
+            self.server.transfers += 1
+        self._respond(200, etag=etag, last_modified=last_modified,
+                      length=os.path.getsize(filename))
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                self.wfile.write(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _get_validators(self, filename):
+        checksum = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                checksum.update(chunk)
+        return ('"{}"'.format(checksum.hexdigest()),
+                formatdate(int(os.path.getmtime(filename)), usegmt=True))
+
+    def _not_modified(self, etag, last_modified):
+        if 'If-None-Match' in self.headers:
+            return self.headers['If-None-Match'] == etag
+        if 'If-Modified-Since' in self.headers:
+            try:
+                return (parsedate_to_datetime(last_modified) <=
+                        parsedate_to_datetime(
+                            self.headers['If-Modified-Since']))
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _respond(self, status, etag=None, last_modified=None, length=0):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+
+def start_server(directory, host='127.0.0.1', port=0):
+    r"""
+    Starts the stand-in server in a background thread.
+
+    Parameters
+    ----------
+    directory : string
+        Directory of the served files.
+    host : string
+        Default: '127.0.0.1'.
+    port : int
+        If 0 a free port is chosen. Default: 0.
+
+    Returns
+    -------
+    server : http.server.ThreadingHTTPServer
+        Running server. Its url is `server.url`, the number of requests is in
+        `server.requests` and the number of transferred files in
+        `server.transfers`. Stop it with `server.shutdown()`.
+
+    """
+    server = ThreadingHTTPServer((host, port), FileStandInHandler)
+    server.daemon_threads = True
+    server.directory = directory
+    server.requests = 0
+    server.transfers = 0
+    server.lock = threading.Lock()
+    server.url = 'http://{}:{}'.format(*server.server_address[:2])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local file server stand-in.")
+    parser.add_argument('directory')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+    server = start_server(args.directory, port=args.port)
+    print("File stand-in running at {}".format(server.url), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
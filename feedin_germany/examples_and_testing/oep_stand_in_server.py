@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the rows endpoint of the OEP API.
+
+Mimics `/api/v0/schema/<schema>/tables/<table>/rows/` (GET) and
+`/api/v0/schema/<schema>/tables/<table>/rows/new` (POST with json
+`{'query': [rows]}`), so that uploads can be tested offline. Like the OEP, it
+does not accept PUT for inserting rows. Rows are kept in memory. A latency per
+request and failing requests can be simulated.
+
+Usage: python oep_stand_in_server.py [--port PORT] [--latency SECONDS]
+                                     [--fail-every N]
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROWS_PATH = re.compile(
+    r'^/api/v0/schema/(?P<schema>[^/]+)/tables/(?P<table>[^/]+)/rows/'
+    r'(?P<new>new)?/?(\?.*)?$')
+
+
+class OEPStandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        match = self._match()
+        if match is None or match.group('new'):
+            return self._respond(404, {'reason': 'Not found'})
+        with self.server.lock:
+            rows = list(self.server.tables.get(
+                (match.group('schema'), match.group('table')), []))
+        self._respond(200, rows)
+
+    def do_POST(self):
+        match = self._match()
+        if match is None or not match.group('new'):
+            return self._respond(404, {'reason': 'Not found'})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            fail = (self.server.fail_every and
+                    self.server.requests % self.server.fail_every == 0)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if fail:
+            return self._respond(503, {'reason': 'Simulated failure'})
+        try:
+            rows = json.loads(body.decode('utf-8'))['query']
+        except (ValueError, KeyError):
+            return self._respond(400, {'reason': 'Invalid query'})
+        if isinstance(rows, dict):
+            rows = [rows]
+        with self.server.lock:
+            self.server.tables.setdefault(
+                (match.group('schema'), match.group('table')), []).extend(
+                rows)
+        self._respond(201, {'rows': len(rows)})
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self._match() is None:
+            return self._respond(404, {'reason': 'Not found'})
+        self._respond(405, {'reason': 'Method not allowed'})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _match(self):
+        return ROWS_PATH.match(self.path)
+
+    def _respond(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(host='127.0.0.1', port=0, latency=0, fail_every=0):
+    r"""
+    Starts the stand-in server in a background thread.
+
+    Parameters
+    ----------
+    host : string
+        Default: '127.0.0.1'.
+    port : int
+        If 0 a free port is chosen. Default: 0.
+    latency : float
+        Time in s each upload request is delayed. Default: 0.
+    fail_every : int
+        If > 0 every `fail_every`-th upload request fails with status 503.
+        Default: 0.
+
+    Returns
+    -------
+    server : http.server.ThreadingHTTPServer
+        Running server. Its url is `server.url`, uploaded rows are in
+        `server.tables` with keys (schema, table). Stop it with
+        `server.shutdown()`.
+
+    """
+    server = ThreadingHTTPServer((host, port), OEPStandInHandler)
+    server.daemon_threads = True
+    server.tables = {}
+    server.requests = 0
+    server.lock = threading.Lock()
+    server.latency = latency
+    server.fail_every = fail_every
+    server.url = 'http://{}:{}'.format(*server.server_address[:2])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OEP stand-in.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+    server = start_server(port=args.port, latency=args.latency,
+                          fail_every=args.fail_every)
+    print("OEP stand-in running at {}".format(server.url), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -15,18 +15,31 @@ import pandas as pd
 import geopandas as gpd
 import os
 import logging
+import functools
+import contextlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import sqlalchemy as sa
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 from feedinlib import region
-from feedinlib import tools
 
 # import internal modules
 from feedin_germany import opsd_power_plants as opsd
 from feedin_germany import oep_regions as oep
 from feedin_germany import pv_modules
 from feedin_germany import mastr_power_plants as mastr
+from feedin_germany import power_plant_register_tools as ppr_tools
+from feedin_germany import profiles
+from feedin_germany import results
+from feedin_germany import instrumentation
+from feedin_germany import oep_upload as oep_upload_tools
+from feedin_germany import weather
+
+
+# columns of the OPSD register needed for the feed-in calculations
+OPSD_REGISTER_COLUMNS = ['lat', 'lon', 'commissioning_date', 'capacity']
 
 
 # Planung Funktionalitäten:
@@ -36,7 +49,10 @@ from feedin_germany import mastr_power_plants as mastr
 
 
 def calculate_feedin(year, register, regions, category, return_feedin=False,
-                     oep_upload=False, **kwargs):
+                     oep_upload=False, n_jobs=1, method='region',
+                     accumulator=None, sink=None, cache=None, profiler=None,
+                     time_resolved_capacity=False, wind_profiles=None,
+                     **kwargs):
     r"""
     Calculates feed-in of power plants in `register` for different `regions`.
 
@@ -49,8 +65,12 @@ def calculate_feedin(year, register, regions, category, return_feedin=False,
     ----------
     year : int
         Year for which feed-in time series are calculated.
-    register : pd.DataFrame
+    register : pd.DataFrame or dict
         todo format --> Anforderung aus feedinlib!
+        Instead of the register a dictionary with the sub-registers of the
+        regions (keys: nuts) as returned by
+        :py:func:`~.power_plant_register_tools.partition_register` can be
+        passed.
     regions : pandas.geoDataFrame
         Regions for which feed-in time series are calculated.
         todo: add required form of GeoDataFrame
@@ -59,10 +79,62 @@ def calculate_feedin(year, register, regions, category, return_feedin=False,
         Options: 'Wind', 'Solar', 'Hydro'.
     return_feedin : boolean
         If True calculated feed-in is returned as pd.DataFrame. Columns see
-        `feedin_df`. Should only be set to True if number of regions is
-         small. Default: False. todo what does small mean?
-    oep_upload : boolean
-        If True time series are uploaded to OEP. Default: False.
+        `feedin_df`. Default: False.
+    oep_upload : boolean or :py:class:`~.oep_upload.OEPUploader`
+        If True time series are uploaded to OEP in chunks of several regions
+        with an :py:class:`~.oep_upload.OEPUploader` configured in
+        feedin_germany.ini, which needs an OEP API token. If an uploader is
+        given, the time series are written to it and it has to be flushed by
+        the caller. Default: False.
+    n_jobs : int or None
+        Number of worker processes the feed-in of the regions is calculated
+        in. If 1 the regions are calculated one after another in the current
+        process, if None all available CPUs are used. The results are the
+        same as for the serial calculation and are processed in the order of
+        `regions`. The workers are not forked from the current process, which
+        may run threads, but started by a fork server (or spawned where fork
+        servers are not available), so scripts have to guard their main code
+        with `if __name__ == "__main__":`. Only used if `method` is 'region'.
+        Default: 1.
+    method : string
+        Calculation method. 'region': the feed-in of each region is
+        calculated with the feedinlib. 'profiles': the normalized feed-in of
+        each technology set and weather location is calculated once and
+        scaled by the capacity of the power plants in each region (see
+        :py:mod:`~.profiles`). 'profiles' is only available for 'Wind' and
+        'Solar'. Default: 'region'.
+    accumulator : :py:class:`~.results.FeedinAccumulator` or None
+        If given, the feed-in of the regions is added to `accumulator`. If
+        `return_feedin` is True all feed-in collected in `accumulator` is
+        returned. Default: None.
+    sink : :py:class:`~.results.FeedinSink` or None
+        If given, the feed-in of each region is written to `sink` in the
+        database format (see :py:func:`~.feedin_to_db_format`) as soon as it
+        is calculated, for example to files with
+        :py:class:`~.results.PartitionedFileSink`. Default: None.
+    cache : :py:class:`~.results.FeedinCache` or None
+        If given, the feed-in of a region is loaded from `cache` if its power
+        plants, the weather, the technical parameters and `year` did not
+        change since it was stored. Only the feed-in of the other regions is
+        calculated and stored in `cache`. Default: None.
+    profiler : :py:class:`~.instrumentation.StageProfiler` or None
+        If given, the wall time, CPU time and memory of the stages of the
+        calculation ('load_weather', 'load_cache', 'calculate_profiles') and
+        of each region ('region') are recorded. Default: None.
+    time_resolved_capacity : boolean
+        If True the installed capacity of each region changes at every time
+        step with the commissioning and decommissioning of its power plants
+        instead of scaling the capacity of power plants commissioned or
+        decommissioned in `year` for the whole year (see
+        :py:func:`~.profiles.aggregate_profiles_time_resolved`). The capacity
+        in `register` must not be scaled by year and the columns
+        :py:attr:`~.power_plant_register_tools.DATE_COLUMNS` are needed.
+        Only available for `method` 'profiles'. Default: False.
+    wind_profiles : dict or None
+        Wind profiles calculated before for `year`, for example for other
+        chunks of a register, to which the calculated profiles are added (see
+        `profiles` in :py:func:`~.profiles.calculate_wind_profiles`). Only
+        used for `method` 'profiles' and `category` 'Wind'. Default: None.
 
     Other parameters
     ----------------
@@ -76,72 +148,253 @@ def calculate_feedin(year, register, regions, category, return_feedin=False,
     else: None.
 
     """
+    if method not in ['region', 'profiles']:
+        raise ValueError("Invalid method {}. ".format(method) +
+                         "Choose from: 'region', 'profiles'.")
+    if method == 'profiles' and category not in ['Wind', 'Solar']:
+        raise ValueError("Method 'profiles' up to now only available for "
+                         "`category` 'Wind' and 'Solar'.")
+    if time_resolved_capacity and method != 'profiles':
+        raise ValueError("`time_resolved_capacity` is only available for "
+                         "method 'profiles'.")
+    region_kwargs = dict(category=category, **kwargs)
+    labels = dict(year=year, category=category)
+    if category in ['Wind', 'Solar']:
+        with instrumentation.stage(profiler, 'load_weather', **labels):
+            weather_store = weather.get_weather_store(category, year)
+            region_kwargs['weather'] = weather.open_weather_store(
+                weather_store)
+    else:
+        weather_store = None
     if category == 'Solar':
-        # todo delete the following lines when weather is integrated in feedinlib, + year input in feedinlib
-        filename = os.path.abspath(
-            "/home/sabine/rl-institut/04_Projekte/163_Open_FRED/03-Projektinhalte/AP2 Wetterdaten/open_FRED_TestWetterdaten_csv/fred_data_test_2016.csv")
-        weather_df = pd.read_csv(filename, skiprows=range(1, 50), nrows=(5000),
-                                 index_col=0,
-                                 date_parser=lambda idx: pd.to_datetime(idx,
-                                                                        utc=True))
-        weather_df.index = pd.to_datetime(weather_df.index).tz_convert(
-            'Europe/Berlin')
-        # calculate ghi
-        weather_df['ghi'] = weather_df.dirhi + weather_df.dhi
-        weather_pv = weather_df.dropna()
-
         # prepare technical parameters and pv modules
-        pv_modules_set = pv_modules.create_pvmodule_dict()
-        distribution_dict = pv_modules.create_distribution_dict()
-
-    # todo delete the following lines when weather is integrated in feedinlib, + year input in feedinlib
-    if category == 'Wind':
-        filename = os.path.abspath(
-        '/home/sabine/rl-institut/04_Projekte/163_Open_FRED/03-Projektinhalte/AP2 Wetterdaten/open_FRED_TestWetterdaten_csv/fred_data_2016_sh.csv')
-        weather_df = tools.example_weather_wind(filename)
-    if return_feedin:
-        feedin_df = pd.DataFrame()
+        region_kwargs['pv_modules_set'] = pv_modules.create_pvmodule_dict()
+        region_kwargs['distribution_dict'] = (
+            pv_modules.create_distribution_dict())
+
+    # select the power plants of each region
+    if not isinstance(register, dict):
+        register = ppr_tools.partition_register(register, column='nuts')
+    nuts_list, register_regions = [], []
     for nut in regions['nuts']:
-        register_region = register.loc[register['nuts'] == nut]
-        if register_region.empty:
+        register_region = register.get(nut)
+        if register_region is None or register_region.empty:
             logging.debug(
                 "No {} power plants in region {} in register.".format(category,
                                                                       nut))
         else:
-            # todo: wenn feedinlib weiterentwickelt: feedinlib Aufruf für alle gleich möglich?
-            if category == 'Solar':
-                register_pv = register_region[
-                    ['lat', 'lon', 'commissioning_date', 'capacity',
-                     'Coordinates']]
-                # open feedinlib to calculate feed in time series for region
-                feedin = region.Region(
-                    geom='no_geom',
-                    weather=weather_pv).pv_feedin_distribution_register(
-                    distribution_dict=distribution_dict,
-                    technical_parameters=pv_modules_set,
-                    register=register_pv)
-            elif category == 'Wind':
-                feedin = region.Region(geom='no_geom',
-                                       weather=weather_df).wind_feedin(
-                    register_region, **kwargs)
-            elif category == 'Hydro':
-                raise ValueError("Hydro not working, yet.")
-            else:
-                raise ValueError("Invalid category {}".format(category) +
-                                 "Choose from: 'Wind', 'Solar', 'Hydro'.")
-            if oep_upload:  # todo zusammenfassen if oep_upload or ...
-                upload_time_series_to_oep(feedin=feedin, technology=category,
-                                          nuts=nut)
-            if return_feedin:
-                feedin = feedin_to_db_format(feedin=feedin, technology=category,
-                                          nuts=nut)
-                feedin_df = pd.concat([feedin_df, feedin])
+            nuts_list.append(nut)
+            register_regions.append(register_region)
+
+    # reuse stored feed-in of regions whose inputs did not change
+    if cache is not None:
+        parameters = dict(kwargs, method=method,
+                          time_resolved_capacity=time_resolved_capacity)
+        for key in ['pv_modules_set', 'distribution_dict']:
+            if key in region_kwargs:
+                parameters[key] = region_kwargs[key]
+        with instrumentation.stage(profiler, 'load_cache', **labels):
+            keys = [cache.get_key(
+                register_region, year=year, category=category,
+                weather=(os.path.basename(weather_store) if weather_store
+                         else None),
+                parameters=parameters) for register_region in register_regions]
+            cached = [cache.load(key) for key in keys]
+        logging.info("Feed-in of {} of {} regions loaded from cache.".format(
+            sum(feedin is not None for feedin in cached), len(cached)))
+    else:
+        keys = cached = [None] * len(nuts_list)
+    compute_nuts = [nut for nut, feedin in zip(nuts_list, cached)
+                    if feedin is None]
+    compute_registers = [
+        register_region for register_region, feedin in zip(register_regions,
+                                                           cached)
+        if feedin is None]
+
+    executor = None
+    if not compute_registers:
+        computed = iter([])
+    elif method == 'profiles' and category == 'Wind':
+        with instrumentation.stage(profiler, 'calculate_profiles', **labels):
+            feedin_regions = profiles.calculate_wind_feedin_by_turbine_type(
+                register=pd.concat(compute_registers),
+                weather=region_kwargs['weather'],
+                time_resolved_capacity=time_resolved_capacity,
+                profiles=wind_profiles, **kwargs)
+        computed = (feedin_regions[nut].rename('feedin')
+                    for nut in compute_nuts)
+    elif method == 'profiles':
+        # the mixed profiles of the pv module sets are stored with the
+        # weather store and shared by all regions and years using it
+        with instrumentation.stage(profiler, 'calculate_profiles', **labels):
+            pv_profiles = profiles.get_pv_profiles(
+                weather_store, pv_modules_set=region_kwargs['pv_modules_set'],
+                distribution_dict=region_kwargs['distribution_dict'],
+                **kwargs)
+            feedin_regions = profiles.calculate_pv_feedin_by_module_set(
+                register=pd.concat(compute_registers),
+                weather=region_kwargs['weather'], pv_profiles=pv_profiles,
+                time_resolved_capacity=time_resolved_capacity)
+        computed = (feedin_regions[nut].rename('feedin')
+                    for nut in compute_nuts)
+    elif n_jobs == 1:
+        # the feedinlib needs the location of solar weather data in columns
+        if category == 'Solar':
+            region_kwargs['weather'] = weather.locations_to_columns(
+                region_kwargs['weather'])
+        computed = (_calculate_region_feedin(register_region, **region_kwargs)
+                    for register_region in compute_registers)
+    else:
+        # the workers open the memory-mapped weather store themselves and
+        # share its pages instead of receiving copies of the weather
+        worker_kwargs = dict(region_kwargs)
+        if 'weather' in worker_kwargs:
+            worker_kwargs['weather'] = weather_store
+        executor = ProcessPoolExecutor(max_workers=n_jobs,
+                                       mp_context=_get_worker_context(),
+                                       initializer=_init_feedin_worker,
+                                       initargs=(worker_kwargs,))
+        # map() returns the results in the order of `compute_registers`
+        computed = executor.map(_calculate_region_feedin_in_worker,
+                                compute_registers)
+    feedins = _merge_cached_feedin(cached, computed, keys=keys, cache=cache)
+
+    if return_feedin and accumulator is None:
+        accumulator = results.FeedinAccumulator(n_regions=len(nuts_list))
+    sinks = [sink] if sink is not None else []
+    # the uploader is closed before the worker processes are shut down; if a
+    # region fails, the chunks not sent yet are discarded and the regions
+    # not started yet are cancelled
+    with contextlib.ExitStack() as stack:
+        if executor is not None:
+            stack.push(lambda exc_type, exc_value, traceback:
+                       executor.shutdown(cancel_futures=exc_type is not None))
+        if oep_upload is True:
+            sinks.append(stack.enter_context(
+                oep_upload_tools.OEPUploader()))
+        elif oep_upload:
+            sinks.append(oep_upload)
+        for nut in nuts_list:
+            # the feed-in is calculated (or received from the workers) when
+            # it is requested from the generator
+            with instrumentation.stage(profiler, 'region', nuts=nut,
+                                       **labels):
+                feedin = next(feedins)
+            if sinks:
+                feedin_db = feedin_to_db_format(
+                    feedin=feedin, technology=category, nuts=nut)
+                for feedin_sink in sinks:
+                    feedin_sink.write(feedin_db, year=year,
+                                      technology=category, nuts=nut)
+            if accumulator is not None:
+                accumulator.add(feedin=feedin, technology=category, nuts=nut)
     if return_feedin:
-        return feedin_df
+        return accumulator.to_db_format()
     else:
         pass
 
 
+def _merge_cached_feedin(cached, computed, keys, cache):
+    r"""
+    Yields the feed-in of the regions in the original order.
+
+    Feed-in that is None in `cached` is taken from `computed` and stored in
+    `cache`.
+
+    """
+    for feedin, key in zip(cached, keys):
+        if feedin is None:
+            feedin = next(computed)
+            if cache is not None:
+                cache.store(key, feedin)
+        yield feedin
+
+
+def _calculate_region_feedin(register_region, category, weather=None,
+                             pv_modules_set=None, distribution_dict=None,
+                             **kwargs):
+    r"""
+    Calculates feed-in of the power plants of one region.
+
+    Parameters
+    ----------
+    register_region : pd.DataFrame
+        Power plants of one region.
+    category : string
+        Energy source category. Options: 'Wind', 'Solar', 'Hydro'.
+    weather : pd.DataFrame or None
+        Weather data as needed by the feedinlib for `category`. Only loaded
+        for 'Wind' and 'Solar'. Default: None.
+    pv_modules_set : dict or None
+        Technical parameters of the pv modules as returned by
+        :py:func:`~.pv_modules.create_pvmodule_dict`. Only needed for 'Solar'.
+    distribution_dict : dict or None
+        Distribution of the pv modules as returned by
+        :py:func:`~.pv_modules.create_distribution_dict`. Only needed for
+        'Solar'.
+
+    Other parameters
+    ----------------
+    Passed to the feedinlib.
+
+    Returns
+    -------
+    feedin : pd.Series
+        Feed-in time series of the region.
+
+    """
+    # todo: wenn feedinlib weiterentwickelt: feedinlib Aufruf für alle gleich möglich?
+    if category == 'Solar':
+        register_pv = register_region[
+            ['lat', 'lon', 'commissioning_date', 'capacity', 'Coordinates']]
+        # open feedinlib to calculate feed in time series for region
+        feedin = region.Region(
+            geom='no_geom',
+            weather=weather).pv_feedin_distribution_register(
+            distribution_dict=distribution_dict,
+            technical_parameters=pv_modules_set,
+            register=register_pv)
+    elif category == 'Wind':
+        feedin = region.Region(geom='no_geom',
+                               weather=weather).wind_feedin(
+            register_region, **kwargs)
+    elif category == 'Hydro':
+        raise ValueError("Hydro not working, yet.")
+    else:
+        raise ValueError("Invalid category {}. ".format(category) +
+                         "Choose from: 'Wind', 'Solar', 'Hydro'.")
+    return feedin
+
+
+# Keyword arguments of _calculate_region_feedin() in worker processes. They are
+# set once per process by _init_feedin_worker() so that the weather data is
+# not sent to the workers with every region.
+_worker_kwargs = {}
+
+
+def _get_worker_context():
+    # forking a process while other threads (prefetching inputs, uploading)
+    # hold locks can deadlock the child
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _init_feedin_worker(region_kwargs):
+    _worker_kwargs.update(region_kwargs)
+    if isinstance(_worker_kwargs.get('weather'), str):
+        _worker_kwargs['weather'] = weather.open_weather_store(
+            _worker_kwargs['weather'])
+        # the feedinlib needs the location of solar weather data in columns
+        if _worker_kwargs['category'] == 'Solar':
+            _worker_kwargs['weather'] = weather.locations_to_columns(
+                _worker_kwargs['weather'])
+
+
+def _calculate_region_feedin_in_worker(register_region):
+    return _calculate_region_feedin(register_region, **_worker_kwargs)
+
+
 def form_feedin_for_deflex(feedin):
     r"""
     Forms feed-in to the form deflex needs it.
@@ -164,23 +417,23 @@ def form_feedin_for_deflex(feedin):
         `category`.
 
     """
-    # initialize data frame for output
-    cols = pd.MultiIndex(levels=[[], []], codes=[[], []])
-    deflex_feedin = pd.DataFrame(columns=cols)
-    filter_df = feedin.groupby(['nuts', 'technology']).size().reset_index().drop(columns=[0],
-                                                                   axis=1)
-    for filters in filter_df.values:
-        df = feedin.loc[(feedin['nuts'] == filters[0]) &
-                        (feedin['technology'] == filters[1])].drop(
-            columns=['nuts', 'technology']).set_index('time')
-        deflex_feedin[filters[0], filters[1].lower()] = df['feedin']
+    # pivot the long format to columns (nuts, technology) in one pass
+    deflex_feedin = feedin.assign(
+        technology=feedin['technology'].str.lower()).set_index(
+        ['time', 'nuts', 'technology'])['feedin'].unstack(
+        ['nuts', 'technology']).sort_index(axis=1)
+    deflex_feedin.columns.names = [None, None]
     return deflex_feedin
 
 
 def calculate_feedin_germany(year, categories, regions='landkreise',
                              register_name='opsd',
                              weather_data_name='open_FRED', oep_upload=False,
-                             return_feedin=False, debug_mode=False, **kwargs):
+                             return_feedin=False, debug_mode=False, n_jobs=1,
+                             method='region', feedin_format='db', sink=None,
+                             cache=None, profiler=None, chunk_size=None,
+                             max_memory=None, prefetch=True,
+                             time_resolved_capacity=False, **kwargs):
     r"""
 
     Es sollen eigene Regionen eingegeben werden können,
@@ -206,14 +459,69 @@ def calculate_feedin_germany(year, categories, regions='landkreise',
     weather_data_name : string
         Specifies the weather data source. Options: 'open_FRED', 'MERRA'.
          Default: 'open_FRED'. todo check
-    oep_upload : boolean
-        If True time series are uploaded to OEP. Default: False.
+    oep_upload : boolean or :py:class:`~.oep_upload.OEPUploader`
+        If True time series of all regions and categories are uploaded to OEP
+        in chunks with an :py:class:`~.oep_upload.OEPUploader` configured in
+        feedin_germany.ini. See :py:func:`~.calculate_feedin`.
+        Default: False.
     return_feedin : boolean
-        If True calculated feed-in is returned as pd.DataFrame. Columns see
-        `feedin_df`. Should only be set to True if number of regions is
-         small. Default: False. todo what does small mean?
+        If True calculated feed-in is returned as pd.DataFrame in the format
+        specified by `feedin_format`. Default: False.
     debug_mode : boolean
         might be deleted
+    n_jobs : int or None
+        Number of worker processes the feed-in of the regions is calculated
+        in. See :py:func:`~.calculate_feedin`. Default: 1.
+    method : string
+        Calculation method. Options: 'region', 'profiles'. See
+        :py:func:`~.calculate_feedin`. Default: 'region'.
+    feedin_format : string
+        Format of the returned feed-in. 'db': long format as returned by
+        :py:func:`~.calculate_feedin`. 'deflex': MultiIndex format as returned
+        by :py:func:`~.form_feedin_for_deflex`. Default: 'db'.
+    sink : :py:class:`~.results.FeedinSink` or None
+        If given, the feed-in of each region is written to `sink` as soon as
+        it is calculated, so that the memory needed does not grow with the
+        number of regions. See :py:func:`~.calculate_feedin`. Default: None.
+    cache : :py:class:`~.results.FeedinCache` or None
+        If given, only the feed-in of regions whose inputs changed is
+        calculated, the feed-in of the other regions is loaded from `cache`.
+        See :py:func:`~.calculate_feedin`. Default: None.
+    profiler : :py:class:`~.instrumentation.StageProfiler` or None
+        If given, the wall time, CPU time and memory of each stage of the
+        calculation ('load_regions', 'load_register', 'add_region_to_register',
+        'get_capacity_matrix', 'get_pp_by_year', 'calculate_feedin' and its
+        stages, 'upload_feedin', 'format_feedin') are recorded.
+        Default: None.
+    chunk_size : int or None
+        If given, the register of each category is read and processed in
+        chunks of `chunk_size` power plants (see
+        :py:func:`~.load_register_chunks`): the power plants of a chunk are
+        assigned to the regions and their feed-in is calculated and added to
+        the feed-in of the regions before the next chunk is read. The
+        register is never loaded completely, which bounds the memory needed
+        for large registers like the 'Solar' register. Default: None.
+    max_memory : float or None
+        Memory in MB the power plants of a chunk may need. If given, the
+        register is processed in chunks and, if `chunk_size` is None, the
+        chunk size is estimated from `max_memory` (see
+        :py:func:`~.power_plant_register_tools.get_chunk_size`). As only one
+        chunk of the register is in memory, this bounds the memory of the
+        register. The memory of the weather data, the profiles of `method`
+        'profiles' and the feed-in time series of the regions is not
+        included. Default: None.
+    prefetch : boolean
+        If True the regions, the register of the first category and the
+        weather stores (see :py:func:`~.weather.get_weather_store`) are
+        loaded concurrently in threads at the start, and the register of the
+        next category is loaded while the feed-in of the current category is
+        calculated. If False the inputs are loaded one after another.
+        Default: True.
+    time_resolved_capacity : boolean
+        If True the installed capacity changes at every time step with the
+        commissioning and decommissioning of the power plants. See
+        :py:func:`~.calculate_feedin`. Only available for `method`
+        'profiles'. Default: False.
 
     Other parameters
     ----------------
@@ -221,64 +529,469 @@ def calculate_feedin_germany(year, categories, regions='landkreise',
 
     Notes
     -----
-    The returned feed-in is in the form as needed by the heat and power model
-    deflex (https://github.com/reegis/deflex).
-    However, `feedin_df` is only returned if `regions` contains less than 26 # todo adapt number?!
-    regions as it is assumed that a energy system optimization of Germany would
-    not be done for more nodes.
+    The feed-in of all regions is collected in a
+    :py:class:`~.results.FeedinAccumulator`, so that `return_feedin` can also
+    be used for many regions like all 'landkreise'. With `feedin_format`
+    'deflex' the feed-in is returned in the form as needed by the heat and
+    power model deflex (https://github.com/reegis/deflex).
+
+    For several years use :py:func:`~.calculate_feedin_germany_multi_year`,
+    which loads the regions and registers only once.
 
     Returns
     -------
-    If `regions` contains less than 26 regions:
+    If `return_feedin` is True:
     feedin_df : pd.DataFrame
         Contains calculated feed-in for each region in `regions`. # todo form of return
     else: None.
 
+    """
+    feedin = calculate_feedin_germany_multi_year(
+        years=[year], categories=categories, regions=regions,
+        register_name=register_name, weather_data_name=weather_data_name,
+        oep_upload=oep_upload, return_feedin=return_feedin,
+        debug_mode=debug_mode, n_jobs=n_jobs, method=method,
+        feedin_format=feedin_format, sink=sink, cache=cache, profiler=profiler,
+        chunk_size=chunk_size, max_memory=max_memory, prefetch=prefetch,
+        time_resolved_capacity=time_resolved_capacity, **kwargs)
+    if return_feedin:
+        return feedin[year]
+    else:
+        pass
+
+
+def calculate_feedin_germany_multi_year(
+        years, categories, regions='landkreise', register_name='opsd',
+        weather_data_name='open_FRED', oep_upload=False, return_feedin=False,
+        debug_mode=False, n_jobs=1, method='region', feedin_format='db',
+        sink=None, cache=None, profiler=None, chunk_size=None,
+        max_memory=None, prefetch=True, time_resolved_capacity=False,
+        **kwargs):
+    r"""
+    Calculates feed-in time series for Germany for several years.
+
+    Inputs that do not depend on the year are only loaded once for all
+    `years`: the regions, the power plant register of each category and the
+    assignment of the power plants to the regions. Per year only the capacity
+    of the power plants is filtered by year (see
+    :py:func:`~.power_plant_register_tools.get_pp_by_year`) and the weather is
+    loaded.
+
+    With `chunk_size` or `max_memory` the register is processed in chunks,
+    so that the region assignment is done once per chunk for all `years`.
+
+    With `prefetch` the inputs are loaded concurrently, so that the time until
+    the first feed-in is calculated is close to the time of loading the
+    slowest input instead of the sum of all inputs. At most the registers of
+    two categories are in memory at the same time.
+
+    Parameters
+    ----------
+    years : list of int
+        Years for which feed-in time series are calculated.
+
+    For the other parameters see :py:func:`~.calculate_feedin_germany`.
+
+    Returns
+    -------
+    If `return_feedin` is True:
+    feedin : dict
+        Feed-in of each year in `years` (keys) in the format specified by
+        `feedin_format`.
+    else: None.
+
+    """
+    if feedin_format not in ['db', 'deflex']:
+        raise ValueError("Invalid feedin_format {}. ".format(feedin_format) +
+                         "Choose from: 'db', 'deflex'.")
+    # one uploader for all categories and years, which is created before the
+    # inputs are loaded, so that a missing configuration fails at once
+    if oep_upload is True:
+        uploader = oep_upload_tools.OEPUploader()
+    else:
+        uploader = oep_upload
+    # the inputs are mostly network or disk bound and loaded in threads
+    executor = ThreadPoolExecutor(max_workers=3) if prefetch else None
+    regions_future = _submit(executor, load_regions, regions,
+                             debug_mode=debug_mode)
+    register_futures = {}
+    if categories:
+        register_futures[categories[0]] = _submit(
+            executor, _get_register_loader(chunk_size, max_memory),
+            register_name, categories[0])
+    weather_futures = {
+        (category, year): _submit(executor, weather.get_weather_store,
+                                  category, year)
+        for category in categories if category in ['Wind', 'Solar']
+        for year in years}
+    try:
+        feedin = _calculate_feedin_of_inputs(
+            years=years, categories=categories, regions_future=regions_future,
+            register_futures=register_futures,
+            weather_futures=weather_futures, register_name=register_name,
+            uploader=uploader, return_feedin=return_feedin,
+            n_jobs=n_jobs, method=method, feedin_format=feedin_format,
+            sink=sink, cache=cache, profiler=profiler, chunk_size=chunk_size,
+            max_memory=max_memory, executor=executor,
+            time_resolved_capacity=time_resolved_capacity, **kwargs)
+        if oep_upload is True:
+            with instrumentation.stage(profiler, 'upload_feedin'):
+                uploader.close()
+        return feedin
+    except BaseException:
+        # inputs that are not needed anymore are not loaded and chunks that
+        # were not uploaded yet are discarded
+        for future in ([regions_future] + list(register_futures.values()) +
+                       list(weather_futures.values())):
+            future.cancel()
+        if oep_upload is True:
+            uploader.abort()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _submit(executor, func, *args, **kwargs):
+    r"""
+    Submits `func` to `executor` or calls it at once if `executor` is None.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Future of the result of `func`.
+
+    """
+    if executor is not None:
+        return executor.submit(func, *args, **kwargs)
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _calculate_feedin_of_inputs(
+        years, categories, regions_future, register_futures, weather_futures,
+        register_name, uploader, return_feedin, n_jobs, method,
+        feedin_format, sink, cache, profiler, chunk_size, max_memory,
+        executor, time_resolved_capacity=False, **kwargs):
+    r"""
+    Calculates feed-in time series for Germany for several years from the
+    futures of the inputs.
+
+    `register_futures` and `weather_futures` are emptied while the inputs are
+    used. With `chunk_size` or `max_memory` the futures of the registers
+    return iterators over chunks (see :py:func:`load_register_chunks`). The
+    time series are written to `uploader` (an
+    :py:class:`~.oep_upload.OEPUploader` or None), which is closed by the
+    caller. See :py:func:`~.calculate_feedin_germany_multi_year`.
+
+    """
+    register_loader = _get_register_loader(chunk_size, max_memory)
+    with instrumentation.stage(profiler, 'load_regions'):
+        region_gdf = regions_future.result()
+
+    if return_feedin:
+        accumulators = {year: results.FeedinAccumulator(
+            n_regions=len(region_gdf)) for year in years}
+    else:
+        accumulators = {}
+    for number, category in enumerate(categories):
+        # get power plant register of all years for all power plants in
+        # Germany and add region column 'nuts' to register
+        with instrumentation.stage(profiler, 'load_register',
+                                   category=category):
+            register = register_futures.pop(category).result()
+        if number + 1 < len(categories):
+            # load the register of the next category in the meantime
+            register_futures[categories[number + 1]] = _submit(
+                executor, register_loader, register_name,
+                categories[number + 1])
+        # the weather stores have to be created before they are opened by
+        # calculate_feedin()
+        for year in years:
+            if (category, year) in weather_futures:
+                weather_futures.pop((category, year)).result()
+        if chunk_size is not None or max_memory is not None:
+            _calculate_feedin_in_chunks(
+                years=years, register_chunks=register, regions=region_gdf,
+                category=category, register_name=register_name,
+                uploader=uploader, accumulators=accumulators, sink=sink,
+                profiler=profiler, n_jobs=n_jobs, method=method, cache=cache,
+                time_resolved_capacity=time_resolved_capacity, **kwargs)
+            continue
+        with instrumentation.stage(profiler, 'add_region_to_register',
+                                   category=category):
+            register = oep.add_region_to_register(register, region_gdf)
+        # the capacities of all years are calculated at once, so that the
+        # register is not copied for every year
+        with instrumentation.stage(profiler, 'get_capacity_matrix',
+                                   category=category):
+            capacities = ppr_tools.get_capacity_matrix(register, years)
+        for year in years:
+            labels = dict(year=year, category=category)
+            with instrumentation.stage(profiler, 'get_pp_by_year', **labels):
+                register_regions = _get_register_regions(
+                    register, year=year, register_name=register_name,
+                    capacities=capacities,
+                    time_resolved_capacity=time_resolved_capacity)
+
+            with instrumentation.stage(profiler, 'calculate_feedin',
+                                       **labels):
+                calculate_feedin(
+                    year=year, register=register_regions, regions=region_gdf,
+                    category=category, oep_upload=uploader, n_jobs=n_jobs,
+                    method=method, accumulator=accumulators.get(year),
+                    sink=sink, cache=cache, profiler=profiler,
+                    time_resolved_capacity=time_resolved_capacity, **kwargs)
+    if return_feedin:
+        with instrumentation.stage(profiler, 'format_feedin'):
+            if feedin_format == 'deflex':
+                return {year: accumulator.to_deflex_format()
+                        for year, accumulator in accumulators.items()}
+            return {year: accumulator.to_db_format()
+                    for year, accumulator in accumulators.items()}
+    else:
+        pass
+
+
+def _get_register_regions(register, year, register_name, capacities=None,
+                          time_resolved_capacity=False):
+    r"""
+    Filters `register` by `year` and partitions it by region.
+
+    If the capacity matrix `capacities` (see
+    :py:func:`~.power_plant_register_tools.get_capacity_matrix`) is given,
+    only the power plants with a capacity in `year` are selected. With
+    `time_resolved_capacity` their capacity is not scaled by year and the
+    date columns are kept.
+
+    """
+    if time_resolved_capacity and capacities is None:
+        capacities = ppr_tools.get_capacity_matrix(register, [year])
+    if capacities is None:
+        register_year = ppr_tools.get_pp_by_year(year=year,
+                                                 register=register)
+    else:
+        running = capacities[year].values > 0
+        register_year = pd.DataFrame(register.loc[running])
+        if not time_resolved_capacity:
+            register_year['capacity'] = capacities[year].values[running]
+    if register_name == 'opsd' and not time_resolved_capacity:
+        register_year = register_year.drop(columns=ppr_tools.DATE_COLUMNS)
+    # partition the register once so that the power plants of a region are
+    # looked up instead of being filtered from the whole register
+    return ppr_tools.partition_register(register_year, column='nuts')
+
+
+def _get_register_loader(chunk_size, max_memory):
+    r"""
+    Returns :py:func:`load_register` or, if the register is processed in
+    chunks, :py:func:`load_register_chunks` for `chunk_size` and
+    `max_memory`.
+
+    """
+    if chunk_size is None and max_memory is None:
+        return load_register
+    return functools.partial(load_register_chunks, chunk_size=chunk_size,
+                             max_memory=max_memory)
+
+
+def _calculate_feedin_in_chunks(years, register_chunks, regions, category,
+                                register_name, method='region',
+                                uploader=None, accumulators=None, sink=None,
+                                profiler=None, time_resolved_capacity=False,
+                                **kwargs):
+    r"""
+    Calculates the feed-in of `years` chunk by chunk of a register.
+
+    The chunks of `register_chunks` (see :py:func:`load_register_chunks`)
+    are processed one after another. The feed-in of the power plants of each
+    chunk is summed up per region and year in a
+    :py:class:`~.results.FeedinAccumulator`. Only the summed up feed-in is
+    written to `sink` and `uploader` and added to `accumulators` after the
+    last chunk, in the order of `regions`. With `method` 'profiles' the wind
+    profiles of a year are calculated once and reused for all chunks.
+
+    For the parameters see :py:func:`~.calculate_feedin_germany_multi_year`.
+    Other parameters are passed to :py:func:`~.calculate_feedin`.
+
+    """
+    sums = {year: results.FeedinAccumulator(n_regions=len(regions),
+                                            reduce=True) for year in years}
+    wind_profiles = {year: {} for year in years}
+    for number, register_chunk in enumerate(register_chunks):
+        with instrumentation.stage(profiler, 'add_region_to_register',
+                                   category=category, chunk=number):
+            register_chunk = oep.add_region_to_register(
+                register_chunk.copy(), regions)
+        with instrumentation.stage(profiler, 'get_capacity_matrix',
+                                   category=category, chunk=number):
+            capacities = ppr_tools.get_capacity_matrix(register_chunk, years)
+        for year in years:
+            labels = dict(year=year, category=category, chunk=number)
+            with instrumentation.stage(profiler, 'get_pp_by_year', **labels):
+                register_regions = _get_register_regions(
+                    register_chunk, year=year, register_name=register_name,
+                    capacities=capacities,
+                    time_resolved_capacity=time_resolved_capacity)
+            with instrumentation.stage(profiler, 'calculate_feedin',
+                                       **labels):
+                calculate_feedin(
+                    year=year, register=register_regions, regions=regions,
+                    category=category, method=method, accumulator=sums[year],
+                    profiler=profiler,
+                    time_resolved_capacity=time_resolved_capacity,
+                    wind_profiles=wind_profiles[year], **kwargs)
+        register_chunk = register_regions = capacities = None
+    wind_profiles = None
+
+    sinks = [feedin_sink for feedin_sink in [sink, uploader] if feedin_sink]
+    for year in years:
+        for nut in regions['nuts']:
+            feedin = sums[year].get(technology=category, nuts=nut)
+            if feedin is None:
+                continue
+            if sinks:
+                feedin_db = feedin_to_db_format(
+                    feedin=feedin, technology=category, nuts=nut)
+                for feedin_sink in sinks:
+                    feedin_sink.write(feedin_db, year=year,
+                                      technology=category, nuts=nut)
+            if accumulators and year in accumulators:
+                accumulators[year].add(feedin=feedin, technology=category,
+                                       nuts=nut)
+        del sums[year]
+
+
+def load_regions(regions, debug_mode=False):
+    r"""
+    Returns the regions for which feed-in time series are calculated.
+
+    Parameters
+    ----------
+    regions : geopandas.GeoDataFrame or string
+        Regions (geopandas.GeoDataFrame) or specification of regions that are
+        loaded from OEP. Options for string: 'landkreise',
+        'uebertragunsnetzzonen'.
+    debug_mode : boolean
+        If True only the first five 'landkreise' are returned.
+        Default: False.
+
+    Returns
+    -------
+    region_gdf : geopandas.GeoDataFrame
+        Regions with nuts in column 'nuts' and geometry in column 'geom'.
+
     """
     # get regions from OEP if regions is not a geopandas.GeoDataFrame
-    if regions == 'landkreise':
+    if isinstance(regions, gpd.GeoDataFrame):
+        region_gdf = regions
+    elif regions == 'landkreise':
         region_gdf = oep.load_regions_file()
         if debug_mode:
             region_gdf = region_gdf[0:5]
     elif regions == 'uebertragunsnetzzonen':
-        pass  # todo add
-    elif isinstance(regions, gpd.GeoDataFrame):
-        region_gdf = regions
+        raise ValueError("Option 'uebertragunsnetzzonen' for `regions` not "
+                         "available, yet.")  # todo add
     else:
         raise ValueError("`regions` should be 'landkreise',"
                          "'uebertragunsnetzzonen' or gpd.GeoDataFrame.")
+    return region_gdf
 
-    if return_feedin:
-        feedin_df = pd.DataFrame()
-    for category in categories:
-        # get power plant register for all power plants in Germany
-        if register_name == 'opsd':
-            keep_cols = ['lat', 'lon', 'commissioning_date', 'capacity']
-            register = opsd.filter_pp_by_source_and_year(year, category,
-                                                         keep_cols=keep_cols)
-        elif register_name == 'MaStR':
-            if category == 'Wind':
-                register = mastr.get_mastr_pp_filtered_by_year(
-                    category=category, year=year)
-            else:
-                raise ValueError("Option 'MaStR' as `register_name` up to "
-                                 "now only available for `category` 'Wind'.")
+
+def load_register(register_name, category):
+    r"""
+    Returns the power plant register of `category` of all years.
+
+    Parameters
+    ----------
+    register_name : string
+        Name of the register. Options: 'opsd', 'MaStR'.
+    category : string
+        Energy source category. Options: 'Wind', 'Solar'.
+
+    Returns
+    -------
+    register : pd.DataFrame
+        Power plant register containing the columns needed for filtering by
+        year with :py:func:`~.power_plant_register_tools.get_pp_by_year`.
+
+    """
+    if register_name == 'opsd':
+        register = opsd.filter_pp_by_source(category,
+                                            keep_cols=OPSD_REGISTER_COLUMNS)
+    elif register_name == 'MaStR':
+        if category == 'Wind':
+            register = mastr.get_mastr_pp(category=category)
         else:
-            raise ValueError("Invalid register name {}.".format(
-                    register_name) + " Must be 'opsd' or 'MaStR.")
-        # add region column 'nuts' to register
-        register = oep.add_region_to_register(register, region_gdf)
-
-        feedin = calculate_feedin(
-            year=year, register=register, regions=region_gdf,
-            category=category, return_feedin=return_feedin,
-            oep_upload=oep_upload, **kwargs)
-        if return_feedin:
-            feedin_df = pd.concat([feedin_df, feedin])  # todo check axis when solar + wind
-    if return_feedin:
-        return feedin_df
+            raise ValueError("Option 'MaStR' as `register_name` up to "
+                             "now only available for `category` 'Wind'.")
     else:
-        pass
+        raise ValueError("Invalid register name {}.".format(
+                register_name) + " Must be 'opsd' or 'MaStR.")
+    return register
+
+
+def load_register_chunks(register_name, category, chunk_size=None,
+                         max_memory=None):
+    r"""
+    Returns the power plant register of `category` of all years in chunks.
+
+    The chunks are read one after another while they are iterated (see
+    :py:func:`~.opsd_power_plants.iter_pp_by_source` and
+    :py:func:`~.mastr_power_plants.iter_mastr_pp`), so that the register is
+    never loaded completely.
+
+    Parameters
+    ----------
+    register_name : string
+        Name of the register. Options: 'opsd', 'MaStR'.
+    category : string
+        Energy source category. Options: 'Wind', 'Solar'.
+    chunk_size : int or None
+        Number of power plants per chunk. If None the chunk size is estimated
+        from `max_memory` and the first power plants of the register (see
+        :py:func:`~.power_plant_register_tools.get_chunk_size`).
+        Default: None.
+    max_memory : float or None
+        Memory in MB the power plants of a chunk may need. Only used if
+        `chunk_size` is None. Default: None.
+
+    Returns
+    -------
+    iterator
+        Chunks (pd.DataFrame) of the register with the columns of the
+        register returned by :py:func:`load_register`.
+
+    """
+    if chunk_size is None:
+        sample = next(_iter_register(register_name, category,
+                                     ppr_tools.CHUNK_SAMPLE_SIZE), None)
+        if sample is None:
+            return iter([])
+        chunk_size = ppr_tools.get_chunk_size(sample, max_memory)
+    logging.info("Processing {} power plants in chunks of {}.".format(
+        category, chunk_size))
+    return _iter_register(register_name, category, chunk_size)
+
+
+def _iter_register(register_name, category, chunk_size):
+    if register_name == 'opsd':
+        return opsd.iter_pp_by_source(category, chunk_size,
+                                      keep_cols=OPSD_REGISTER_COLUMNS)
+    elif register_name == 'MaStR':
+        if category == 'Wind':
+            return mastr.iter_mastr_pp(category=category,
+                                       chunk_size=chunk_size)
+        else:
+            raise ValueError("Option 'MaStR' as `register_name` up to "
+                             "now only available for `category` 'Wind'.")
+    else:
+        raise ValueError("Invalid register name {}.".format(
+                register_name) + " Must be 'opsd' or 'MaStR.")
 
 
 def feedin_to_db_format(feedin, technology, nuts):
@@ -303,7 +1016,8 @@ def feedin_to_db_format(feedin, technology, nuts):
     return df
 
 
-def upload_time_series_to_oep(feedin, technology, nuts):
+def upload_time_series_to_oep(feedin, technology, nuts, year=None,
+                              uploader=None):
     r"""
     Uploads feed-in time series to OEP 'model_draft' schema.
 
@@ -312,16 +1026,30 @@ def upload_time_series_to_oep(feedin, technology, nuts):
     the feed-in origins from as in `technology` and 'nut' the region nut of the
     calculated feed-in as given in `nut`
 
+    For uploading the feed-in of many regions use one
+    :py:class:`~.oep_upload.OEPUploader` for all regions (see `oep_upload` in
+    :py:func:`~.calculate_feedin`), which sends the time series in chunks.
+
     feedin : pd.Series
         Feed-in time series with datetime index.
     technology : string
         todo
     nuts : ... todo
+    year : int or None
+        Year of the feed-in. Default: None.
+    uploader : :py:class:`~.oep_upload.OEPUploader` or None
+        Uploader the time series is written to. It has to be flushed by the
+        caller. If None an uploader configured in feedin_germany.ini is used
+        and the time series is uploaded immediately. Default: None.
 
     """
     # prepare data frame for upload
     df = feedin_to_db_format(feedin=feedin, technology=technology, nuts=nuts)
-    # todo upload  --> maybe form of Günni.... er weiß Bescheid, dass er uns Input geben soll.
+    if uploader is None:
+        with oep_upload_tools.OEPUploader() as uploader:
+            uploader.write(df, year=year, technology=technology, nuts=nuts)
+    else:
+        uploader.write(df, year=year, technology=technology, nuts=nuts)
 
 
 if __name__ == "__main__":
@@ -332,11 +1060,11 @@ if __name__ == "__main__":
         # 'Solar',
         # 'Hydro'
     ]
+    feedin = calculate_feedin_germany_multi_year(
+        years=years, categories=categories, regions='landkreise',
+        register_name='opsd', weather_data_name='open_FRED',
+        return_feedin=True, oep_upload=False, debug_mode=True)
     for year in years:
-        feedin = calculate_feedin_germany(
-            year=year, categories=categories, regions='landkreise',
-            register_name='opsd', weather_data_name='open_FRED',
-            return_feedin=True, oep_upload=True, debug_mode=True)
-        print(feedin)
-        deflex_feedin = form_feedin_for_deflex(feedin=feedin)
+        print(feedin[year])
+        deflex_feedin = form_feedin_for_deflex(feedin=feedin[year])
         print(deflex_feedin.head())
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+The `file_tools` module contains helper functions for writing files.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import os
+import re
+import time
+import uuid
+import shutil
+import contextlib
+
+
+# seconds after which versions of a directory that are not linked are removed
+ORPHAN_AGE = 600
+
+
+@contextlib.contextmanager
+def write_atomically(filename):
+    r"""
+    Yields a temporary name whose content replaces `filename` at the end.
+
+    The content is written to a temporary file or directory with a unique
+    name next to `filename`, so that several processes can write the same
+    file at the same time. It only replaces `filename` if the block finishes
+    without an error, so no incomplete files remain if writing is
+    interrupted.
+
+    A file is replaced with one rename. A directory is kept as a version with
+    a unique name and `filename` becomes a symbolic link to it, which is
+    replaced with one rename as well. So readers that resolve the link once
+    (see :py:func:`os.path.realpath`) always find one complete version. The
+    replaced version is removed, as are versions left over by processes that
+    wrote `filename` at the same time once they are older than `ORPHAN_AGE`
+    seconds. Where symbolic links are not permitted, the
+    existing directory is renamed and the new directory is renamed to
+    `filename`.
+
+    Parameters
+    ----------
+    filename : string
+        File or directory that is written.
+
+    Yields
+    ------
+    tmp_filename : string
+        Temporary file or directory the content is written to. A directory
+        has to be created by the caller.
+
+    """
+    tmp_filename = _get_unique_filename(filename) + '.tmp'
+    try:
+        yield tmp_filename
+        if os.path.isdir(tmp_filename):
+            _replace_directory(tmp_filename, filename)
+        else:
+            os.replace(tmp_filename, filename)
+    finally:
+        _remove(tmp_filename)
+
+
+def _get_unique_filename(filename):
+    return '{}.{}'.format(filename, uuid.uuid4().hex)
+
+
+def _replace_directory(tmp_path, path):
+    version = _get_unique_filename(path)
+    os.rename(tmp_path, version)
+    link = _get_unique_filename(path) + '.tmp'
+    try:
+        # relative, so that the data directory can be moved
+        os.symlink(os.path.basename(version), link, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        return _rename_directory(version, path)
+    old_version = os.path.realpath(path) if os.path.islink(path) else None
+    try:
+        os.replace(link, path)
+    except OSError:
+        # `path` is a directory written without a link
+        os.remove(link)
+        return _rename_directory(version, path)
+    if old_version is not None and old_version != os.path.realpath(path):
+        shutil.rmtree(old_version, ignore_errors=True)
+    _remove_orphaned_versions(path)
+
+
+def _remove_orphaned_versions(path):
+    # processes writing `path` at the same time both remove the version they
+    # have seen, so the version linked by the slower one is left over; older
+    # versions only, as another process may be about to link its version
+    current = os.path.basename(os.path.realpath(path))
+    pattern = re.compile(
+        re.escape(os.path.basename(path)) + '\\.[0-9a-f]{32}$')
+    directory = os.path.dirname(path) or '.'
+    for name in os.listdir(directory):
+        filename = os.path.join(directory, name)
+        if not pattern.match(name) or name == current:
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            if time.time() - os.lstat(filename).st_ctime > ORPHAN_AGE:
+                _remove(filename)
+
+
+def _rename_directory(tmp_path, path):
+    # a directory cannot replace an existing directory, so the existing one
+    # is moved away first
+    old_path = _get_unique_filename(path) + '.tmp'
+    try:
+        os.rename(path, old_path)
+    except FileNotFoundError:
+        old_path = None
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.lexists(path):
+            if old_path is not None:
+                os.rename(old_path, path)
+            raise
+        # another process has written the directory in the meantime, which
+        # is kept
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    if old_path is not None:
+        _remove(old_path)
+
+
+def _remove(filename):
+    if os.path.islink(filename) or os.path.isfile(filename):
+        os.remove(filename)
+    elif os.path.isdir(filename):
+        shutil.rmtree(filename, ignore_errors=True)
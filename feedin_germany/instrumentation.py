@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+The `instrumentation` module contains a profiler recording the wall time, CPU
+time and memory of the stages of a feed-in calculation.
+
+The profiler is opt-in: functions taking a `profiler` parameter only record
+stages if a :py:class:`StageProfiler` is given.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import sys
+import json
+import time
+import tracemalloc
+import contextlib
+import pandas as pd
+
+
+class StageProfiler(object):
+    r"""
+    Records wall time, CPU time and memory of named stages.
+
+    Stages are recorded with the context manager :py:meth:`stage` and may be
+    nested. Every stage can be labelled, for example with the year, category
+    or nuts of the region it belongs to.
+
+    Parameters
+    ----------
+    trace_memory : boolean
+        If True the peak memory allocated by Python in each stage is traced
+        with :py:mod:`tracemalloc`. Tracing slows down the calculation.
+        Default: True.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dictionary per finished stage with the keys 'stage', 'labels',
+        'depth', 'start' (s since the profiler was created), 'wall_time' and
+        'cpu_time' (s), 'peak_memory' and 'memory_delta' (bytes traced by
+        tracemalloc, None if `trace_memory` is False) and 'max_rss' (peak
+        resident set size of the process in bytes at the end of the stage,
+        None on platforms without the `resource` module like Windows).
+
+    """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+        self._start = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        r"""
+        Records the stage `name` while the context is entered.
+
+        Parameters
+        ----------
+        name : string
+            Name of the stage, for example 'load_register'.
+
+        Other parameters
+        ----------------
+        Labels of the stage, for example `year` or `nuts`.
+
+        """
+        frame = {'stage': name, 'labels': labels, 'depth': len(self._stack)}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak so far belongs to all enclosing stages before it is
+            # reset for this stage
+            self._update_peaks(peak)
+            tracemalloc.reset_peak()
+            frame['memory'] = current
+            frame['peak'] = current
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            self._stack.pop()
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], peak)
+                self._update_peaks(peak)
+                tracemalloc.reset_peak()
+                peak_memory = peak
+                memory_delta = current - frame['memory']
+            else:
+                peak_memory = memory_delta = None
+            self.records.append({
+                'stage': name, 'labels': labels, 'depth': frame['depth'],
+                'start': wall_start - self._start, 'wall_time': wall_time,
+                'cpu_time': cpu_time, 'peak_memory': peak_memory,
+                'memory_delta': memory_delta, 'max_rss': _get_max_rss()})
+
+    def _update_peaks(self, peak):
+        for frame in self._stack:
+            frame['peak'] = max(frame['peak'], peak)
+
+    def to_dataframe(self):
+        r"""
+        Returns the records as pd.DataFrame with one column per label.
+
+        """
+        if not self.records:
+            return pd.DataFrame()
+        records = pd.DataFrame(self.records)
+        labels = pd.DataFrame(list(records.pop('labels')),
+                              index=records.index)
+        return pd.concat([records, labels], axis=1)
+
+    def summary(self):
+        r"""
+        Summarizes the records per stage.
+
+        Returns
+        -------
+        summary : pd.DataFrame
+            Number of calls, total wall and CPU time (s) and maximum peak
+            memory (MB) per stage, sorted by total wall time.
+
+        """
+        if not self.records:
+            return pd.DataFrame()
+        records = pd.DataFrame(self.records)
+        records['peak_memory'] = records['peak_memory'].astype(float) / 1e6
+        summary = records.groupby('stage').agg(
+            calls=('wall_time', 'size'), wall_time=('wall_time', 'sum'),
+            cpu_time=('cpu_time', 'sum'), peak_memory=('peak_memory', 'max'))
+        summary = summary.rename(columns={'peak_memory': 'peak_memory_mb'})
+        return summary.sort_values('wall_time', ascending=False)
+
+    def report(self):
+        r"""
+        Returns the records and the summary as dictionary for a json report.
+
+        """
+        summary = self.summary()
+        return {
+            'python': sys.version,
+            'trace_memory': self.trace_memory,
+            'max_rss': _get_max_rss(),
+            'stages': self.records,
+            'summary': json.loads(summary.to_json(orient='index'))}
+
+    def to_json(self, filename):
+        r"""
+        Writes the report (see :py:meth:`report`) to the json file
+        `filename`.
+
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+    def stop(self):
+        r"""
+        Stops tracing memory.
+
+        """
+        if self.trace_memory:
+            tracemalloc.stop()
+
+
+def stage(profiler, name, **labels):
+    r"""
+    Returns a context manager recording stage `name` with `profiler`.
+
+    If `profiler` is None nothing is recorded.
+
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, **labels)
+
+
+def _get_max_rss():
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return None
+    # ru_maxrss is given in kB on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
@@ -4,6 +4,7 @@ from matplotlib import pyplot as plt
 
 # internal imports
 from feedin_germany import feedin
+from feedin_germany import instrumentation
 
 # Ziele
 # 1. Feedin f. Landkreise berechnen und auf OEP laden
@@ -11,6 +12,8 @@ from feedin_germany import feedin
 
 
 debug_mode = True  # Only 4 regions are calculated.
+profile_run = False  # Report of wall time, CPU time and memory per stage.
+oep_upload = False  # Needs an OEP API token in feedin_germany.ini.
 
 years = [2012]
 categories = [
@@ -23,12 +26,17 @@ categories = [
 #  auswählbar, je nachdem was noch umgesetzt wird; opsd/mastr, versch. parameter der pvlib/windpowerlib
 
 # Upload of feed-in time series for "Landkreise" Germany
-for year in years:
-        feedin = feedin.calculate_feedin_germany(
-            year=year, categories=categories, regions='landkreise',
-            register_name='opsd', weather_data_name='open_FRED',
-            oep_upload=True, debug_mode=debug_mode, wake_losses_model=None)
-        print(feedin)
-
-        # feedin.plot()
-        # plt.show()
\ No newline at end of file
+# regions and registers are loaded only once for all years
+profiler = instrumentation.StageProfiler() if profile_run else None
+feedin.calculate_feedin_germany_multi_year(
+    years=years, categories=categories, regions='landkreise',
+    register_name='opsd', weather_data_name='open_FRED',
+    oep_upload=oep_upload, debug_mode=debug_mode, profiler=profiler,
+    wake_losses_model=None)
+if profiler is not None:
+    print(profiler.summary())
+    profiler.to_json(os.path.join(os.path.dirname(__file__),
+                                  'feedin_germany_profile.json'))
+
+# feedin.plot()
+# plt.show()
\ No newline at end of file
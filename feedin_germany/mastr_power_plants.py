@@ -30,6 +30,18 @@ from feedin_germany import oep_regions
 from feedin_germany import power_plant_register_tools as ppr_tools
 
 
+# english names of the columns of the MaStR wind register
+WIND_COLUMNS = {
+    'Nabenhoehe': 'hub_height', 'Rotordurchmesser': 'rotor_diameter',
+    # 'HerstellerName', 'Einheitart', 'Einheittyp', 'Technologie',
+    'Typenbezeichnung': 'turbine_type', 'Laengengrad': 'lon',
+    'Breitengrad': 'lat', 'Inbetriebnahmedatum': 'commissioning_date',
+    'DatumEndgueltigeStilllegung': 'decommissioning_date',
+    'DatumBeginnVoruebergehendeStilllegung': 'temporary_decom_date',
+    'DatumWiederaufnahmeBetrieb': 'resumption_date',
+    'Bruttoleistung': 'capacity'}
+
+
 def load_mastr_data_from_oedb():
     """
     Loads the MaStR power plant units ...todo
@@ -63,7 +75,7 @@ def load_mastr_data_from_oedb():
     print(register)
 
 
-def helper_load_mastr_from_file(category):
+def helper_load_mastr_from_file(category, columns=None, chunk_size=None):
     r"""
     todo remove when loaded from oedb
 
@@ -79,30 +91,34 @@ def helper_load_mastr_from_file(category):
     category : string
         Energy source category for which the register is loaded. Options:
         'Wind', ... to be added.
+    columns : list or None
+        English names of the columns that are loaded (see
+        :py:attr:`WIND_COLUMNS`). If None all columns are loaded.
+        Default: None.
+    chunk_size : int or None
+        If not None the file is read in chunks of `chunk_size` rows.
+        Default: None.
 
     Returns
     -------
+    mastr_data : pd.DataFrame or iterator
+        Raw MaStR data or, if `chunk_size` is not None, an iterator over
+        chunks of it.
 
     """
     if category == 'Wind':
         filename = os.path.join(
             '~/Daten_flexibel_01/bnetza_mastr/bnetza_mastr_power-units_v1.2/',
             'bnetza_mastr_1.2_wind.csv'.format(category.lower()))
-        usecols = [
-            'Nabenhoehe', 'Rotordurchmesser',
-            # 'HerstellerName', 'Einheitart', 'Einheittyp', 'Technologie',
-            'Typenbezeichnung', 'Laengengrad', 'Breitengrad',
-            'Inbetriebnahmedatum', 'DatumEndgueltigeStilllegung',
-            'DatumBeginnVoruebergehendeStilllegung',
-            'DatumWiederaufnahmeBetrieb', 'Bruttoleistung'
-                ]
+        usecols = [raw for raw, column in WIND_COLUMNS.items()
+                   if columns is None or column in columns]
     elif category == 'Solar':
         raise ValueError("Solar MaStR data not added, yet.")
     else:
         raise ValueError("Category {} not existent. ".format(category) +
                          "Choose from: 'Wind', ...") # todo add
     mastr_data = pd.read_csv(filename, sep=';', encoding='utf-8',
-                             header=0, usecols=usecols)
+                             header=0, usecols=usecols, chunksize=chunk_size)
     return mastr_data
 
 
@@ -135,16 +151,7 @@ def prepare_mastr_data(mastr_data, category):
 
     """
     if category == 'Wind':  # todo: add 'name' column of name matching from Ludwig!!!
-        mastr_data.rename(columns={
-            'Nabenhoehe': 'hub_height', 'Rotordurchmesser': 'rotor_diameter',
-            # 'HerstellerName', 'Einheitart', 'Einheittyp', 'Technologie',
-            'Typenbezeichnung': 'turbine_type', 'Laengengrad': 'lon',
-            'Breitengrad': 'lat', 'Inbetriebnahmedatum': 'commissioning_date',
-            'DatumEndgueltigeStilllegung': 'decommissioning_date',
-            'DatumBeginnVoruebergehendeStilllegung': 'temporary_decom_date',
-            'DatumWiederaufnahmeBetrieb': 'resumption_date',
-            'Bruttoleistung': 'capacity'
-        }, inplace=True)
+        mastr_data.rename(columns=WIND_COLUMNS, inplace=True)
     #
     date_cols = ('commissioning_date', 'decommissioning_date')
     prepared_df = ppr_tools.prepare_dates(df=mastr_data, date_cols=date_cols,
@@ -152,18 +159,95 @@ def prepare_mastr_data(mastr_data, category):
     return prepared_df
 
 
+def get_mastr_pp(category, years=None, bbox=None, columns=None,
+                 chunk_size=None):
+    r"""
+    Returns the prepared MaStR register of `category` of all years.
+
+    Power plants with missing coordinates are removed. The register can be
+    filtered by year with
+    :py:func:`~.power_plant_register_tools.get_pp_by_year`.
+
+    The power plants can be selected by `years` and `bbox` (see
+    :py:func:`~.power_plant_register_tools.get_register_filters`) while the
+    file is read. Only the columns needed for `columns` and the filters are
+    read.
+
+    Parameters
+    ----------
+    category : string
+        Energy source category. Options: 'Wind'.
+    years : tuple or None
+        First and last year (int). Power plants running in at least one year
+        of the range are selected. If None all years are selected.
+        Default: None.
+    bbox : tuple or None
+        Bounding box (lon_min, lat_min, lon_max, lat_max) of the power plants.
+        If None all locations are selected. Default: None.
+    columns : list or None
+        Columns of the register. The columns needed for filtering by year
+        (see :py:attr:`~.power_plant_register_tools.DATE_COLUMNS`) are always
+        contained. If None all columns are contained. Default: None.
+    chunk_size : int or None
+        If not None the file is read and filtered in chunks of `chunk_size`
+        rows, so that the whole file is never in memory. Default: None.
+
+    """
+    return pd.concat(list(iter_mastr_pp(
+        category=category, chunk_size=chunk_size, years=years, bbox=bbox,
+        columns=columns)))
+
+
+def iter_mastr_pp(category, chunk_size, years=None, bbox=None, columns=None):
+    r"""
+    Yields the prepared MaStR register of `category` of all years in chunks.
+
+    The chunks are read, prepared and filtered one after another, so that the
+    register is never loaded completely. See :py:func:`get_mastr_pp` for the
+    parameters.
+
+    Parameters
+    ----------
+    chunk_size : int or None
+        Number of rows of the file read per chunk. Chunks contain less power
+        plants after filtering. If None the register is yielded as one chunk.
+
+    Yields
+    ------
+    register : pd.DataFrame
+        Chunk of the prepared MaStR register.
+
+    """
+    filters = ppr_tools.get_register_filters(years=years, bbox=bbox)
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns) + [
+            column for column in ['lat', 'lon', 'commissioning_date',
+                                  'decommissioning_date']
+            if column not in columns]
+    mastr_pp = helper_load_mastr_from_file(
+        category=category, columns=read_columns, chunk_size=chunk_size)
+    if chunk_size is None:
+        mastr_pp = [mastr_pp]
+    for chunk in mastr_pp:
+        chunk = prepare_mastr_data(chunk, category)
+        chunk = ppr_tools.remove_pp_with_missing_coordinates(
+            register=chunk, category=category, register_name='MaStR')
+        chunk = ppr_tools.filter_register(chunk, filters)
+        if columns is not None:
+            chunk = chunk[list(columns) + [
+                column for column in ppr_tools.DATE_COLUMNS
+                if column not in columns]]
+        yield chunk
+
+
 def get_mastr_pp_filtered_by_year(category, year):
     r"""
 
 
     """
-    mastr_pp = helper_load_mastr_from_file(category=category)
-    prepared_data = prepare_mastr_data(mastr_pp, category)
-    filtered_register = ppr_tools.get_pp_by_year(year=year,
-                                                 register=prepared_data)
-    filtered_register = ppr_tools.remove_pp_with_missing_coordinates(
-        register=filtered_register, category=category, register_name='MaStR')
-    return filtered_register
+    return ppr_tools.get_pp_by_year(year=year,
+                                    register=get_mastr_pp(category=category))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+The `oep_upload` module contains functions for uploading feed-in time series
+to the OpenEnergy Platform (OEP).
+
+The rows of many regions are collected in chunks, which are sent concurrently
+with a bounded number of requests in flight over a pooled HTTP session. Failed
+requests are retried with exponential backoff.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# internal imports
+from feedin_germany import config as cfg
+from feedin_germany.results import FeedinSink
+
+
+# status codes of responses after which a request is retried
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class OEPUploader(FeedinSink):
+    r"""
+    Uploads feed-in time series to a table of the OEP in chunks.
+
+    Rows written with :py:meth:`write` are buffered and sent in chunks of
+    `chunk_size` rows by `max_workers` threads. At most `2 * max_workers`
+    chunks are waiting or in flight at the same time, :py:meth:`write` blocks
+    until a chunk is finished otherwise. :py:meth:`flush` has to be called
+    after the last region has been written.
+
+    Used as context manager the upload is closed at the end of the block. If
+    the block raises an error, the chunks not sent yet are discarded (see
+    :py:meth:`abort`).
+
+    Parameters
+    ----------
+    url : string or None
+        Url of the OEP. If None it is read from section 'oep' of
+        feedin_germany.ini. Default: None.
+    schema : string or None
+        Schema of the table. If None it is read from section 'oep' of
+        feedin_germany.ini. Default: None.
+    table : string or None
+        Table the time series are uploaded to. If None it is read from section
+        'oep' of feedin_germany.ini. Default: None.
+    token : string or None
+        OEP API token. If None it is read from section 'oep' of
+        feedin_germany.ini. A ValueError is raised if no token is configured
+        there either. Default: None.
+    chunk_size : int or None
+        Maximum number of rows per request. If None it is read from section
+        'oep' of feedin_germany.ini. Default: None.
+    max_workers : int or None
+        Number of concurrent requests. If None it is read from section 'oep'
+        of feedin_germany.ini. Default: None.
+    max_retries : int or None
+        Number of retries of a failed request. If None it is read from
+        section 'oep' of feedin_germany.ini. Default: None.
+    backoff : float or None
+        Waiting time in s before the first retry. The waiting time is doubled
+        with every retry. If None it is read from section 'oep' of
+        feedin_germany.ini. Default: None.
+
+    """
+    def __init__(self, url=None, schema=None, table=None, token=None,
+                 chunk_size=None, max_workers=None, max_retries=None,
+                 backoff=None):
+        self.url = _from_config(url, 'url').rstrip('/')
+        self.schema = _from_config(schema, 'schema')
+        self.table = _from_config(table, 'feedin_table')
+        self.token = _from_config(token, 'token')
+        if self.token is None:
+            raise ValueError(
+                "No OEP API token. Set 'token' in section 'oep' of "
+                "feedin_germany.ini or pass `token`.")
+        self.chunk_size = _from_config(chunk_size, 'chunk_size')
+        self.max_workers = _from_config(max_workers, 'max_workers')
+        self.max_retries = _from_config(max_retries, 'max_retries')
+        self.backoff = _from_config(backoff, 'backoff')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Authorization'] = 'Token {}'.format(self.token)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._slots = threading.BoundedSemaphore(2 * self.max_workers)
+        self._futures = []
+        self._rows = []
+        self._lock = threading.Lock()
+        self.uploaded_rows = 0
+
+    @property
+    def rows_url(self):
+        return '{}/api/v0/schema/{}/tables/{}/rows/new'.format(
+            self.url, self.schema, self.table)
+
+    def write(self, feedin_df, year, technology, nuts):
+        r"""
+        Adds the feed-in of one region to the upload.
+
+        Parameters
+        ----------
+        feedin_df : pd.DataFrame
+            Feed-in of the region in the database format (see
+            :py:func:`~.feedin.feedin_to_db_format`).
+        year : int
+            Year of the feed-in.
+        technology : string
+            Technology the feed-in origins from, for example 'Wind'.
+        nuts : string
+            Nuts of the region.
+
+        """
+        columns = {column: feedin_df[column].tolist()
+                   for column in feedin_df.columns}
+        columns['time'] = feedin_df['time'].astype(str).tolist()
+        columns['year'] = [year] * len(feedin_df)
+        keys = list(columns)
+        self._rows.extend(dict(zip(keys, values))
+                          for values in zip(*columns.values()))
+        while len(self._rows) >= self.chunk_size:
+            self._submit(self._rows[:self.chunk_size])
+            self._rows = self._rows[self.chunk_size:]
+
+    def flush(self):
+        r"""
+        Sends the remaining rows and waits until all requests are finished.
+
+        Raises the error of the first failed request, if any.
+
+        """
+        if self._rows:
+            self._submit(self._rows)
+            self._rows = []
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        logging.info("{} rows uploaded to {}.{}.".format(
+            self.uploaded_rows, self.schema, self.table))
+
+    def close(self):
+        r"""
+        Flushes the upload and releases the threads and connections.
+
+        """
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+            self.session.close()
+
+    def abort(self):
+        r"""
+        Discards the rows not sent yet and releases the threads and
+        connections.
+
+        Chunks that are already being sent are finished, the others are
+        cancelled.
+
+        """
+        self._rows = []
+        self._futures = []
+        self._executor.shutdown(cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _submit(self, rows):
+        self._slots.acquire()
+        future = self._executor.submit(self._upload_chunk, rows)
+        future.add_done_callback(lambda f: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_chunk(self, rows):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.rows_url,
+                                             json={'query': rows})
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                error = e
+            else:
+                if response.status_code in [200, 201]:
+                    with self._lock:
+                        self.uploaded_rows += len(rows)
+                    return len(rows)
+                error = ConnectionError(
+                    "Upload to OEP not successful. Error: {}".format(
+                        response.status_code))
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+            if attempt < self.max_retries:
+                wait = self.backoff * 2 ** attempt
+                logging.debug("Upload of {} rows failed ({}). ".format(
+                    len(rows), error) + "Retry in {} s.".format(wait))
+                time.sleep(wait)
+        raise error
+
+
+def _from_config(value, key):
+    if value is None:
+        return cfg.get('oep', key)
+    return value
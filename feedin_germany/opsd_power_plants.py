@@ -23,35 +23,86 @@ __license__ = "GPLv3"
 
 # Python libraries
 import os
+import json
+import hashlib
+import functools
 import logging
 import datetime
+import threading
 
 # External libraries
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 import pyproj
-import requests
-from shapely.wkt import loads as wkt_loads
-from shapely.geometry import Point
-import io
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
 
 # oemof libraries
 from oemof.tools import logger
 
 # Internal modules
 from feedin_germany import config as cfg
+from feedin_germany import download
+from feedin_germany import file_tools
 from feedin_germany import geometries
 from feedin_germany import power_plant_register_tools as ppr_tools
 
 
-def load_original_opsd_file(latest=False):
+# version of the processing in prepare_opsd_file(); increase it if the
+# processing changes, so that prepared registers are created again
+PREPARED_VERSION = 2
+
+# dtypes of the columns of the prepared register
+PREPARED_DTYPES = {
+    'energy_source_level_1': 'category',
+    'energy_source_level_2': 'category',
+    'energy_source_level_3': 'category',
+    'technology': 'category',
+    'voltage_level': 'category',
+    'com_year': 'int16',
+    'decom_year': 'int16',
+    'com_month': 'int8',
+    'decom_month': 'int8',
+    'lat': 'float64',
+    'lon': 'float64',
+    'capacity': 'float64'}
+PREPARED_DATE_COLUMNS = ['commissioning_date', 'decommissioning_date']
+
+# the prepared register is sorted by these columns and written in row groups
+# of PREPARED_ROW_GROUP_SIZE rows, so that reading it with filters (see
+# query_register()) skips the row groups of other energy sources and years
+PREPARED_SORT_COLUMNS = ['energy_source_level_2', 'com_year']
+PREPARED_ROW_GROUP_SIZE = 50000
+
+# register stores of the prepared registers by `latest` and the loaded columns
+# (see get_register_store())
+_register_stores = {}
+_register_stores_lock = threading.Lock()
+
+# wind zones of locations by key of the wind zone geometries (see
+# get_wind_zones_of_locations()); at most WIND_ZONE_CACHE_SIZE locations are
+# kept, the wind zones of the geometries used least recently are dropped first
+WIND_ZONE_CACHE_SIZE = 1000000
+_wind_zone_locations = {}
+_wind_zone_locations_lock = threading.Lock()
+
+
+def load_original_opsd_file(latest=False, revalidate=True):
     r"""
     loads register from server
 
+    The file is streamed into the download cache and only downloaded again if
+    it changed on the server (see :py:func:`~.download.download_file`).
+
     parameters
     ----------
     'latest': boolean
+    revalidate : boolean
+        If False a cached file is used without asking the server.
+        Default: True.
 
     Returns
     -------
@@ -66,74 +117,109 @@ def load_original_opsd_file(latest=False):
     else:
         url_section = 'opsd_url_2017'
 
-    # Download non existing files. If you think that there are newer files you
-    # have to set overwrite=True to overwrite existing with downloaded files.
+    # The file is downloaded if it is not cached. With revalidate=True a cached
+    # file is replaced if the server has a newer one, with revalidate=False it
+    # is used as it is.
 
-    logging.warning("Start downloading the register file from server.")
-    logging.warning("Check URL if download does not work.")
-    req = requests.get(cfg.get(url_section, 'renewable_data')).content
+    logging.info("Check URL if download does not work.")
+    filename = download.download_file(cfg.get(url_section, 'renewable_data'),
+                                      revalidate=revalidate)
 
-    df = pd.read_csv(io.StringIO(req.decode('utf-8')))
+    df = pd.read_csv(filename, encoding='utf-8')
 
     return df
 
 
+@functools.lru_cache(maxsize=None)
+def get_utm_transformer(zone):
+    r"""
+    Returns a transformer from the northern utm `zone` (WGS84) to
+    latitude/longitude.
+
+    The transformers are cached, as creating them is expensive.
+
+    """
+    return pyproj.Transformer.from_crs(32600 + int(zone), 4326,
+                                       always_xy=True)
+
+
 def convert_utm_code_opsd(df):
     # *** Convert utm if present ***
-    utm_zones = list()
-    # Get all utm zones.
     if 'utm_zone' in df:
-        df_utm = df.loc[(df.lon.isnull()) & (df.utm_zone.notnull())]
-
-        utm_zones = df_utm.utm_zone.unique()
-
-    # Loop over utm zones and convert utm coordinates to latitude/longitude.
-    for zone in utm_zones:
-        my_utm = pyproj.Proj(
-            "+proj=utm +zone={0},+north,+ellps=WGS84,".format(str(int(zone))) +
-            "+datum=WGS84,+units=m,+no_defs")
-        utm_df = df_utm.loc[df_utm.utm_zone == int(zone),
-                            ('utm_east', 'utm_north')]
-        coord = my_utm(utm_df.utm_east.values, utm_df.utm_north.values,
-                       inverse=True)
-        df.loc[(df.lon.isnull()) & (df.utm_zone == int(zone)), 'lat'] = (
-            coord[1])
-        df.loc[(df.lon.isnull()) & (df.utm_zone == int(zone)), 'lon'] = (
-            coord[0])
+        utm = (df.lon.isnull() & df.utm_zone.notnull()).values
+        zones = df.utm_zone.values[utm]
+        east = df.utm_east.values[utm]
+        north = df.utm_north.values[utm]
+        lon = np.full(len(zones), np.nan)
+        lat = np.full(len(zones), np.nan)
+        # Convert the utm coordinates of each utm zone to latitude/longitude.
+        for zone in pd.unique(zones):
+            in_zone = zones == zone
+            lon[in_zone], lat[in_zone] = get_utm_transformer(
+                zone).transform(east[in_zone], north[in_zone])
+        df.loc[utm, 'lat'] = lat
+        df.loc[utm, 'lon'] = lon
     return df
 
 
+def get_postcode_centroids():
+    r"""
+    Returns the centroid of every postcode polygon.
+
+    The polygons of the postcode file in section 'geometry' of
+    feedin_germany.ini are parsed once and their centroids are cached in a csv
+    file next to it. The cache is created again if the postcode file changes.
+
+    Returns
+    -------
+    centroids : pd.DataFrame
+        Columns 'lon' and 'lat' of the centroids indexed by the postcode.
+
+    """
+    filename = os.path.join(
+        os.path.dirname(__file__), cfg.get('paths', 'geometry'),
+        cfg.get('geometry', 'postcode_polygon'))
+    centroid_filename = '{}_centroids.csv'.format(
+        os.path.splitext(filename)[0])
+    if (os.path.isfile(centroid_filename) and
+            os.path.getmtime(centroid_filename) >=
+            os.path.getmtime(filename)):
+        return pd.read_csv(centroid_filename, index_col='zip_code')
+    pstc = pd.read_csv(filename, index_col='zip_code')
+    centroids = gpd.GeoSeries.from_wkt(pstc.iloc[:, 0]).centroid
+    centroids = pd.DataFrame({'lon': centroids.x.values,
+                              'lat': centroids.y.values},
+                             index=pstc.index)
+    centroids = centroids.loc[~centroids.index.duplicated()]
+    with file_tools.write_atomically(centroid_filename) as tmp_filename:
+        centroids.to_csv(tmp_filename)
+    return centroids
+
+
 def guess_coordinates_by_postcode_opsd(df):
     # *** Use postcode ***
     if 'postcode' in df:
-        df_pstc = df.loc[(df.lon.isnull() & df.postcode.notnull())]
-        if len(df_pstc) > 0:
-            pstc = pd.read_csv(os.path.join(
-                os.path.dirname(__file__), cfg.get('paths', 'geometry'),
-                cfg.get('geometry', 'postcode_polygon')), index_col='zip_code')
-        for idx, val in df_pstc.iterrows():
-            try:
-                # If the postcode is not number the integer conversion will
-                # raise a ValueError. Some postcode look like this '123XX'.
-                # It would be possible to add the mayor regions to the postcode
-                # map in order to search for the first two/three digits.
-                postcode = int(val.postcode)
-                if postcode in pstc.index:
-                    df.loc[df.id == val.id, 'lon'] = wkt_loads(
-                        pstc.loc[postcode].values[0]).centroid.x
-                    df.loc[df.id == val.id, 'lat'] = wkt_loads(
-                        pstc.loc[postcode].values[0]).centroid.y
-                # Replace the last number with a zero and try again.
-                elif round(postcode / 10) * 10 in pstc.index:
-                    postcode = round(postcode / 10) * 10
-                    df.loc[df.id == val.id, 'lon'] = wkt_loads(
-                        pstc.loc[postcode].values[0]).centroid.x
-                    df.loc[df.id == val.id, 'lat'] = wkt_loads(
-                        pstc.loc[postcode].values[0]).centroid.y
-                else:
-                    logging.debug("Cannot find postcode {0}.".format(postcode))
-            except ValueError:
-                logging.debug("Cannot find postcode {0}.".format(val.postcode))
+        missing = (df.lon.isnull() & df.postcode.notnull()).values
+        if not missing.any():
+            return df
+        pstc = get_postcode_centroids()
+        # Postcodes that are not numbers are skipped. Some postcode look like
+        # this '123XX'. It would be possible to add the mayor regions to the
+        # postcode map in order to search for the first two/three digits.
+        postcode = np.trunc(pd.to_numeric(df.postcode.values[missing],
+                                          errors='coerce'))
+        coordinates = pstc.reindex(postcode).values
+        # Replace the last number with a zero and try again.
+        unknown = np.isnan(coordinates[:, 0])
+        coordinates[unknown] = pstc.reindex(
+            np.round(postcode[unknown] / 10) * 10).values
+        found = ~np.isnan(coordinates[:, 0])
+        missing[missing] = found
+        df.loc[missing, 'lon'] = coordinates[found, 0]
+        df.loc[missing, 'lat'] = coordinates[found, 1]
+        if not found.all():
+            logging.debug("Cannot find {0} postcodes.".format(
+                (~found).sum()))
     return df
 
 
@@ -146,11 +232,10 @@ def guess_coordinates_by_spatial_names_opsd(df, fs_column, cap_col,
                 df.loc[df.municipality_code == 'AWZ', fs_column] = 'AWZ_NS'
         if 'postcode' in df:
             df.loc[df.postcode == '000XX', fs_column] = 'AWZ'
-        states = df.loc[df.lon.isnull()].groupby(
-            fs_column).sum()[cap_col]
+        states = df.loc[df.lon.isnull()].groupby(fs_column)[cap_col].sum()
         logging.debug("Fraction of undefined capacity by federal state " +
                       "(percentage):")
-        for (state, capacity) in states.iteritems():
+        for (state, capacity) in states.items():
             logging.debug("{0}: {1:.4f}".format(
                 state, capacity / total_cap * 100))
             stat.loc[state, 'undefined_capacity'] = capacity
@@ -165,11 +250,13 @@ def guess_coordinates_by_spatial_names_opsd(df, fs_column, cap_col,
         # Use the centroid of each federal state if the federal state is given.
         # This is not very precise and should not be used for a high fraction
         # of plants.
-        f2c = f2c.applymap(wkt_loads).centroid
-        for l in df.loc[(df.lon.isnull() & df[fs_column].notnull())].index:
-            if df.loc[l, fs_column] in f2c.index:
-                df.loc[l, 'lon'] = f2c[df.loc[l, fs_column]].x
-                df.loc[l, 'lat'] = f2c[df.loc[l, fs_column]].y
+        f2c = gpd.GeoSeries.from_wkt(f2c.iloc[:, 0]).centroid
+        missing = df.lon.isnull().values
+        states = df[fs_column].values[missing]
+        df.loc[missing, 'lon'] = pd.Series(
+            f2c.x.values, index=f2c.index).reindex(states).values
+        df.loc[missing, 'lat'] = pd.Series(
+            f2c.y.values, index=f2c.index).reindex(states).values
     return df
 
 
@@ -269,7 +356,42 @@ def remove_cols(df, cols):
     return df
 
 
-def prepare_opsd_file(overwrite):
+def get_prepared_filename(url):
+    r"""
+    Returns the file name of the prepared register of the OPSD file `url`.
+
+    The name contains a key of `url` and :py:attr:`PREPARED_VERSION`, so that
+    a prepared register is only used for the file and processing it was
+    created with.
+
+    """
+    key = hashlib.sha1(json.dumps([url, PREPARED_VERSION]).encode(
+        'utf-8')).hexdigest()
+    return os.path.join(
+        os.path.dirname(__file__), cfg.get('paths', 'opsd'),
+        '{}_{}.parquet'.format(
+            os.path.splitext(cfg.get('opsd', 'opsd_prepared'))[0], key[:16]))
+
+
+def set_prepared_dtypes(df):
+    r"""
+    Converts the columns of the prepared register to compact types.
+
+    Energy sources and technology are categorical, years and months small
+    integers, coordinates and capacity floats (see
+    :py:attr:`PREPARED_DTYPES`) and dates datetimes.
+
+    """
+    for column, dtype in PREPARED_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    for column in PREPARED_DATE_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+
+def prepare_opsd_file(overwrite=False, latest=False):
     r"""
     Loads original opsd file and processes it.
 
@@ -278,31 +400,36 @@ def prepare_opsd_file(overwrite):
 
     capacity in W
 
+    The prepared register is stored typed in parquet format (see
+    :py:func:`set_prepared_dtypes`) and loaded from there as long as the url
+    of the OPSD file and :py:attr:`PREPARED_VERSION` do not change. Parts of
+    it can be loaded with :py:func:`query_register`.
+
     Parameters
     ----------
     overwrite : boolean
+        If True the prepared register is created again. Default: False.
+    latest : boolean
+        If True the latest OPSD file is used, otherwise the one of 2017.
+        Default: False.
 
     Returns
     -------
     df : pd. DataFrame()
         todo..
     """
-    opsd_directory = cfg.get('paths', 'opsd')
-    prepared_filename = os.path.join(
-            os.path.dirname(__file__),
-            cfg.get('paths', 'opsd'),
-            cfg.get('opsd', 'opsd_prepared'))
+    url_section = 'opsd_url_latest' if latest else 'opsd_url_2017'
+    prepared_filename = get_prepared_filename(
+        cfg.get(url_section, 'renewable_data'))
 
-    if os.path.isfile(prepared_filename):
-        logging.warning("prepared-register already exist and is loaded "
-                        "from csv")
-        df = pd.read_csv(prepared_filename)
-        return df
+    if os.path.isfile(prepared_filename) and not overwrite:
+        logging.info("prepared-register already exist and is loaded "
+                     "from {}".format(prepared_filename))
+        return read_prepared_register(prepared_filename)
 
-    if not os.path.exists(opsd_directory):
-        os.makedirs(opsd_directory, exist_ok=True)
+    os.makedirs(os.path.dirname(prepared_filename), exist_ok=True)
 
-    df = load_original_opsd_file(overwrite)
+    df = load_original_opsd_file(latest=latest)
 
     remove_list = [
             'tso', 'dso', 'dso_id', 'eeg_id', 'bnetza_id', 'federal_state',
@@ -338,10 +465,300 @@ def prepare_opsd_file(overwrite):
     # capacity in W  todo @Inia: feedinlib wants to give back feedin ts in W. Capacity input in pvlib in W convenient?
     df['capacity'] = df['capacity'] * (10 ** 6)
 
-    df.to_csv(prepared_filename)
+    df = set_prepared_dtypes(df.sort_values(
+        [col for col in PREPARED_SORT_COLUMNS if col in df],
+        kind='stable').reset_index(drop=True))
+    write_prepared_register(df, prepared_filename)
     return df
 
 
+def write_prepared_register(df, filename):
+    r"""
+    Writes the prepared register `df` to the parquet file `filename`.
+
+    Categorical columns are written as strings, as the statistics of
+    dictionary columns are not used for skipping row groups when the file is
+    read with filters. They are read as categorical columns again by
+    :py:func:`read_prepared_register`.
+
+    """
+    categories = [col for col in df if df[col].dtype.name == 'category']
+    with file_tools.write_atomically(filename) as tmp_filename:
+        df.astype({col: object for col in categories}).to_parquet(
+            tmp_filename, index=False,
+            row_group_size=PREPARED_ROW_GROUP_SIZE)
+
+
+def read_prepared_register(filename, columns=None, filters=None):
+    r"""
+    Reads the prepared register from the parquet file `filename`.
+
+    Parameters
+    ----------
+    filename : string
+    columns : list or None
+        Columns that are read. If None all columns are read. Default: None.
+    filters : list of tuples or None
+        Only the power plants matching the filters (see
+        :py:func:`~.power_plant_register_tools.get_register_filters`) are
+        read. Default: None.
+
+    """
+    table = pq.read_table(filename, columns=columns, filters=filters or None)
+    return _prepared_table_to_pandas(table)
+
+
+def iter_prepared_register(filename, chunk_size, columns=None, filters=None):
+    r"""
+    Reads the prepared register from the parquet file `filename` in chunks.
+
+    The row groups are read one after another and row groups without power
+    plants matching `filters` are skipped, so that only one chunk is in
+    memory at a time.
+
+    Parameters
+    ----------
+    filename : string
+    chunk_size : int
+        Number of power plants per chunk. The last chunk may be smaller.
+    columns : list or None
+        Columns that are read. If None all columns are read. Default: None.
+    filters : list of tuples or None
+        Only the power plants matching the filters (see
+        :py:func:`~.power_plant_register_tools.get_register_filters`) are
+        read. Default: None.
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunk of the prepared register.
+
+    """
+    batches = ds.dataset(filename, format='parquet').to_batches(
+        columns=columns,
+        filter=pq.filters_to_expression(filters) if filters else None,
+        batch_size=chunk_size, batch_readahead=0, fragment_readahead=0)
+    # the batches end at the row groups and contain only the matching power
+    # plants, so they are joined to chunks of `chunk_size` power plants
+    table = None
+    for batch in batches:
+        table = (pa.Table.from_batches([batch]) if table is None else
+                 pa.concat_tables([table, pa.Table.from_batches([batch])]))
+        while table.num_rows >= chunk_size:
+            yield _prepared_table_to_pandas(table.slice(0, chunk_size))
+            table = table.slice(chunk_size)
+    if table is not None and table.num_rows > 0:
+        yield _prepared_table_to_pandas(table)
+
+
+def _prepared_table_to_pandas(table):
+    # the categorical columns are encoded after reading, as reading them as
+    # dictionaries disables skipping row groups
+    for col, dtype in PREPARED_DTYPES.items():
+        if dtype == 'category' and col in table.column_names:
+            table = table.set_column(
+                table.column_names.index(col), col,
+                table.column(col).dictionary_encode())
+    return table.to_pandas()
+
+
+def query_register(energy_source=None, years=None, bbox=None, columns=None,
+                   latest=False, chunk_size=None):
+    r"""
+    Loads the power plants of the prepared OPSD register matching a query.
+
+    The filters are pushed into reading the prepared register (see
+    :py:func:`prepare_opsd_file`), so that only the matching power plants and
+    the requested columns are loaded.
+
+    Parameters
+    ----------
+    energy_source : string or None
+        Energy source as named in column 'energy_source_level_2' of register.
+        If None all energy sources are loaded. Default: None.
+    years : tuple or None
+        First and last year (int). Power plants running in at least one year
+        of the range are loaded. If None all years are loaded. Default: None.
+    bbox : tuple or None
+        Bounding box (lon_min, lat_min, lon_max, lat_max) of the power plants.
+        If None all locations are loaded. Default: None.
+    columns : list or None
+        Columns that are loaded. If None all columns are loaded.
+        Default: None.
+    latest : boolean
+        If True the latest OPSD file is used, otherwise the one of 2017.
+        Default: False.
+    chunk_size : int or None
+        If not None the matching power plants are read in chunks of
+        `chunk_size` power plants (see :py:func:`iter_prepared_register`).
+        Default: None.
+
+    Returns
+    -------
+    register : pd.DataFrame or iterator
+        Matching power plants of the OPSD register or, if `chunk_size` is not
+        None, an iterator over chunks of them.
+
+    """
+    filters = ppr_tools.get_register_filters(
+        energy_source=energy_source, years=years, bbox=bbox,
+        source_column='energy_source_level_2')
+    url_section = 'opsd_url_latest' if latest else 'opsd_url_2017'
+    prepared_filename = get_prepared_filename(
+        cfg.get(url_section, 'renewable_data'))
+    if not os.path.isfile(prepared_filename):
+        register = prepare_opsd_file(latest=latest)
+        if chunk_size is None:
+            register = ppr_tools.filter_register(register, filters)
+            if columns is not None:
+                register = register[columns]
+            return register.reset_index(drop=True)
+        # the prepared register has been written and is read in chunks
+        del register
+    if chunk_size is not None:
+        return iter_prepared_register(prepared_filename, chunk_size,
+                                      columns=columns, filters=filters)
+    return read_prepared_register(prepared_filename, columns=columns,
+                                  filters=filters)
+
+
+def get_register_store(latest=False, overwrite=False, columns=None):
+    r"""
+    Returns the prepared OPSD register as
+    :py:class:`~.power_plant_register_tools.RegisterStore`.
+
+    The power plants of an energy source are loaded with
+    :py:func:`query_register` when they are first needed and kept for the
+    rest of the process, so that the power plants of other energy sources
+    are never loaded. Later calls with the same `columns` return the same
+    store.
+
+    Parameters
+    ----------
+    latest : boolean
+        If True the latest OPSD file is used, otherwise the one of 2017.
+        Default: False.
+    overwrite : boolean
+        If True the prepared register is created again (see
+        :py:func:`prepare_opsd_file`) and the stores of `latest` are emptied.
+        Default: False.
+    columns : list or None
+        Columns that are loaded. They have to contain the columns needed by
+        :py:meth:`~.power_plant_register_tools.RegisterStore.get_pp_by_year`
+        (see :py:func:`get_register_columns`). If None all columns are
+        loaded. Default: None.
+
+    """
+    key = (latest, None if columns is None else tuple(columns))
+    with _register_stores_lock:
+        if overwrite:
+            prepare_opsd_file(overwrite=True, latest=latest)
+            for store_key in [store_key for store_key in _register_stores
+                              if store_key[0] == latest]:
+                del _register_stores[store_key]
+        if key not in _register_stores:
+            _register_stores[key] = ppr_tools.RegisterStore(
+                source_column='energy_source_level_2',
+                loader=functools.partial(query_register, columns=columns,
+                                         latest=latest))
+        return _register_stores[key]
+
+
+def get_register_columns(keep_cols=None):
+    r"""
+    Returns the columns of the prepared register loaded for `keep_cols`.
+
+    These are `keep_cols`, the coordinates and capacity and the columns
+    needed for filtering by year (see
+    :py:attr:`~.power_plant_register_tools.DATE_COLUMNS`). If `keep_cols` is
+    None all columns are loaded and None is returned.
+
+    """
+    if keep_cols is None:
+        return None
+    return keep_cols + [
+        col for col in ['lat', 'lon', 'capacity'] + ppr_tools.DATE_COLUMNS
+        if col not in keep_cols]
+
+
+def filter_pp_by_source(energy_source, keep_cols=None):
+    r"""
+    Returns by `energy_source` filtered OPSD register of all years.
+
+    If the `energy_source` is 'Wind' typical wind turbine types depending on
+    the wind zones as well as wind power plant specific data is added to the
+    register (see :py:func:`~.assign_turbine_data_by_wind_zone`).
+
+    The register can be filtered by year with
+    :py:func:`~.power_plant_register_tools.get_pp_by_year` afterwards, so that
+    it only needs to be loaded once for several years.
+
+    Parameters
+    ----------
+    energy_source : string
+        Energy source as named in column 'energy_source_level_2' of register.
+    keep_cols : list or None
+        Column names to be selected from OPSD register. The columns needed for
+        filtering by year (see
+        :py:attr:`~.power_plant_register_tools.DATE_COLUMNS`) are always kept.
+        Only the columns needed for `keep_cols` are loaded (see
+        :py:func:`get_register_columns`). If None, all columns are kept.
+        Default: 'None'.
+
+    Returns
+    -------
+    register : pd.DataFrame
+        ...
+    """
+    if energy_source not in ['Wind', 'Solar']:
+        logging.warning("category must be 'Wind' or 'Solar'")
+    register = get_register_store(
+        columns=get_register_columns(keep_cols)).get(energy_source)
+    return _complete_register(register, energy_source, keep_cols=keep_cols)
+
+
+def iter_pp_by_source(energy_source, chunk_size, keep_cols=None,
+                      latest=False):
+    r"""
+    Yields the OPSD register of `energy_source` of all years in chunks.
+
+    The chunks are read one after another from the prepared register (see
+    :py:func:`query_register`), so that the register is never loaded
+    completely. Each chunk is completed like the register returned by
+    :py:func:`filter_pp_by_source`.
+
+    Parameters
+    ----------
+    energy_source : string
+        Energy source as named in column 'energy_source_level_2' of register.
+    chunk_size : int
+        Number of power plants read per chunk. Chunks may contain less power
+        plants after removing power plants without coordinates or, for
+        'Wind', outside of the wind zones.
+    keep_cols : list or None
+        Column names to be selected from OPSD register. The columns needed for
+        filtering by year (see
+        :py:attr:`~.power_plant_register_tools.DATE_COLUMNS`) are always kept.
+        If None, all columns are kept. Default: 'None'.
+    latest : boolean
+        If True the latest OPSD file is used, otherwise the one of 2017.
+        Default: False.
+
+    Yields
+    ------
+    register : pd.DataFrame
+        Chunk of the register of `energy_source`.
+
+    """
+    if energy_source not in ['Wind', 'Solar']:
+        logging.warning("category must be 'Wind' or 'Solar'")
+    for register in query_register(energy_source=energy_source,
+                                   columns=get_register_columns(keep_cols),
+                                   latest=latest, chunk_size=chunk_size):
+        yield _complete_register(register, energy_source,
+                                 keep_cols=keep_cols)
+
+
 def filter_pp_by_source_and_year(year, energy_source, keep_cols=None):  # todo evtl get
     r"""
     Returns by `energy_source` and `year` filtered OPSD register.
@@ -350,6 +767,10 @@ def filter_pp_by_source_and_year(year, energy_source, keep_cols=None):  # todo e
     the wind zones as well as wind power plant specific data is added to the
     register (see :py:func:`~.assign_turbine_data_by_wind_zone`).
 
+    The power plants running in `year` are looked up in the register store
+    (see :py:func:`get_register_store`), so that the register is only loaded
+    once for several years and energy sources.
+
     Parameters
     ----------
     year : int
@@ -358,32 +779,202 @@ def filter_pp_by_source_and_year(year, energy_source, keep_cols=None):  # todo e
     energy_source : string
         Energy source as named in column 'energy_source_level_2' of register.
     keep_cols : list or None
-        Column names to be selected from OPSD register. If None, all columns
-        are kept. Default: 'None'.
+        Column names to be selected from OPSD register. Only the columns
+        needed for `keep_cols` are loaded (see
+        :py:func:`get_register_columns`). If None, all columns are kept.
+        Default: 'None'.
 
     Returns
     -------
     filtered_register : pd.DataFrame
         ...
     """
-    df = prepare_opsd_file(overwrite=False)
     if energy_source not in ['Wind', 'Solar']:
         logging.warning("category must be 'Wind' or 'Solar'")
-    register = df.loc[df['energy_source_level_2'] == energy_source]
+    filtered_register = get_register_store(
+        columns=get_register_columns(keep_cols)).get_pp_by_year(
+        year=year, source=energy_source)
+    filtered_register = _complete_register(filtered_register, energy_source,
+                                           keep_cols=keep_cols)
+    if keep_cols is not None:
+        filtered_register = filtered_register.drop(columns=[
+            col for col in ppr_tools.DATE_COLUMNS if col not in keep_cols])
+    return filtered_register
+
+
+def _complete_register(register, energy_source, keep_cols=None):
+    r"""
+    Removes power plants without coordinates from `register`, selects
+    `keep_cols` and the date columns and adds turbine data to wind power
+    plants.
+
+    """
     register = ppr_tools.remove_pp_with_missing_coordinates(
         register=register, category=energy_source, register_name='opsd')
-
-    # filter by year
-    filtered_register = ppr_tools.get_pp_by_year(year=year,
-                                                 register=register)
+    # the register of the store must not be changed
     if keep_cols is not None:
-        filtered_register = filtered_register[keep_cols]
+        register = register[keep_cols + [
+            col for col in ppr_tools.DATE_COLUMNS if col not in keep_cols]]
+    else:
+        register = register.copy()
     if energy_source == 'Wind':
-        filtered_register = assign_turbine_data_by_wind_zone(filtered_register)
-    return filtered_register
+        register = assign_turbine_data_by_wind_zone(register)
+    return register
+
+
+@functools.lru_cache(maxsize=None)
+def load_wind_zones(path, filename):
+    r"""
+    Loads the wind zone polygons.
+
+    The wind zones are cached, so that the file is only read once. The key of
+    their geometries (see :py:func:`get_wind_zones_key`) is computed once and
+    stored in the attribute 'geometry_key' of `attrs`.
+
+    Returns
+    -------
+    wind_zones : geopandas.GeoDataFrame
+        Wind zone polygons indexed by the number of the wind zone. Do not
+        change it in place, as it is cached.
+
+    """
+    wind_zones = geometries.load(path=path, filename=filename).set_index(
+        'zone')
+    wind_zones.attrs['geometry_key'] = get_wind_zones_key(wind_zones)
+    return wind_zones
 
 
-def assign_turbine_data_by_wind_zone(register):
+def get_wind_zones_key(wind_zones):
+    r"""
+    Returns a key of the geometries of `wind_zones`.
+
+    The wind zones of locations are cached by this key (see
+    :py:func:`get_wind_zones_of_locations`).
+
+    """
+    return hashlib.sha1(b''.join(wind_zones.geometry.to_wkb())).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_turbine_sets(zones):
+    r"""
+    Returns the typical turbine type of each wind zone in `zones`.
+
+    The turbine types are read from the sections 'wind_set<zone>' of
+    feedin_germany.ini once and cached.
+
+    Parameters
+    ----------
+    zones : tuple
+        Numbers of the wind zones.
+
+    Returns
+    -------
+    turbine_sets : pd.DataFrame
+        Turbine type ('name'), hub height in m ('hub_height'), rotor diameter
+        in m ('rotor_diameter') and unambiguous turbine id ('id') indexed by
+        the number of the wind zone.
+
+    """
+    turbine_sets = pd.DataFrame(
+        [[cfg.get('wind_set{}'.format(zone), 'name'),
+          int(cfg.get('wind_set{}'.format(zone), 'hub_height')),
+          int(cfg.get('wind_set{}'.format(zone), 'rotor_diameter')),
+          cfg.get('wind_set{}'.format(zone), 'set_name')] for zone in zones],
+        index=list(zones), columns=['name', 'hub_height', 'rotor_diameter',
+                                    'id'])
+    turbine_sets.index.name = 'wind_zone'
+    return turbine_sets
+
+
+def get_wind_zones_of_locations(lon, lat, wind_zones, key=None):
+    r"""
+    Returns the wind zone of each location.
+
+    The wind zone polygons are prepared, so that their spatial index is built
+    once, and only the locations within the bounding box of a polygon are
+    tested. The wind zones of locations are cached per wind zone geometries,
+    so that the wind zones of power plants are only determined once for
+    several years. At most :py:attr:`WIND_ZONE_CACHE_SIZE` locations are
+    cached.
+
+    Parameters
+    ----------
+    lon : np.array
+        Longitudes of the locations.
+    lat : np.array
+        Latitudes of the locations.
+    wind_zones : geopandas.GeoDataFrame
+        Wind zone polygons indexed by the number of the wind zone (see
+        :py:func:`load_wind_zones`).
+    key : string or None
+        Key of the geometries of `wind_zones` (see
+        :py:func:`get_wind_zones_key`). If None it is computed from
+        `wind_zones`. Default: None.
+
+    Returns
+    -------
+    zones : np.array
+        Number of the wind zone of each location. NaN if a location is not
+        within a wind zone.
+
+    """
+    if key is None:
+        key = get_wind_zones_key(wind_zones)
+    with _wind_zone_locations_lock:
+        cached = _wind_zone_locations.pop(key, None)
+        if cached is not None:
+            # the wind zones of these geometries are used most recently
+            _wind_zone_locations[key] = cached
+    # a location is looked up by the complex number lon + i * lat
+    locations = np.asarray(lon, dtype=np.float64) + 1j * np.asarray(
+        lat, dtype=np.float64)
+    zones = np.full(len(locations), np.nan)
+    if cached is None:
+        new = np.ones(len(locations), dtype=bool)
+    else:
+        positions = cached.index.get_indexer(locations)
+        new = positions < 0
+        zones[~new] = cached.values[positions[~new]]
+    if new.any():
+        new_locations = pd.unique(locations[new])
+        new_zones = pd.Series(np.nan, index=pd.Index(new_locations))
+        zone_geometries = np.asarray(wind_zones.geometry.values)
+        # preparing does not change the geometries, it only adds the index
+        shapely.prepare(zone_geometries)
+        # the zone of a location within several wind zones is the first one
+        for zone, geometry in zip(wind_zones.index[::-1],
+                                  zone_geometries[::-1]):
+            lon_min, lat_min, lon_max, lat_max = geometry.bounds
+            candidates = np.flatnonzero(
+                (new_locations.real >= lon_min) &
+                (new_locations.real <= lon_max) &
+                (new_locations.imag >= lat_min) &
+                (new_locations.imag <= lat_max))
+            within = shapely.contains_xy(
+                geometry, new_locations.real[candidates],
+                new_locations.imag[candidates])
+            new_zones.iloc[candidates[within]] = zone
+        zones[new] = new_zones.values[
+            new_zones.index.get_indexer(locations[new])]
+        _cache_wind_zones_of_locations(key, new_zones)
+    return zones
+
+
+def _cache_wind_zones_of_locations(key, new_zones):
+    with _wind_zone_locations_lock:
+        cached = _wind_zone_locations.pop(key, None)
+        if cached is not None:
+            # other threads may have added some of the locations meanwhile
+            new_zones = pd.concat([cached, new_zones.loc[
+                ~new_zones.index.isin(cached.index)]])
+        _wind_zone_locations[key] = new_zones.iloc[-WIND_ZONE_CACHE_SIZE:]
+        while sum(len(zones) for zones in _wind_zone_locations.values()) > (
+                WIND_ZONE_CACHE_SIZE):
+            del _wind_zone_locations[next(iter(_wind_zone_locations))]
+
+
+def assign_turbine_data_by_wind_zone(register, wind_zones=None):
     r"""
     Assigns turbine data to a power plant register depending on wind zones.
     todo: source?! DIBt.
@@ -395,7 +986,12 @@ def assign_turbine_data_by_wind_zone(register):
     use your own file and specify your own turbine types per wind zone by
     adjusting the data in feedin_germany.ini.
 
+    The wind zones and turbine types are loaded once and the wind zones of the
+    locations of the power plants are cached (see
+    :py:func:`get_wind_zones_of_locations`).
+
     The following data is added as columns to `register`:
+    - wind zone in column 'wind_zone',
     - turbine type in column 'name',
     - hub height in m in column 'hub_height' and
     - rotor diameter in m in column 'rotor_diameter',
@@ -407,49 +1003,42 @@ def assign_turbine_data_by_wind_zone(register):
     register : pd.DataFrame
         Power plants register. Contains power plants' locations in columns
         'lat' and 'lon'. Other columns are ignored but are part of the output.
+    wind_zones : geopandas.GeoDataFrame or None
+        Wind zone polygons with the number of the wind zone in column 'zone'.
+        If None the wind zones are read from the shape file. Default: None.
 
     Returns
     -------
     adapted_register : pd.DataFrame
         `register` which additionally contains turbine type ('name'), hub
         height in m ('hub_height'), rotor diameter in m ('rotor_diameter') and
-        unambiguous turbine id ('id').
+        unambiguous turbine id ('id'). Power plants outside of the wind zones
+        are removed.
 
     """
     # get wind zones polygons
-    # path = cfg.get('paths', 'geometry')
-    path = '/home/sabine/rl-institut/04_Projekte/163_Open_FRED/03-Projektinhalte/AP3 4 Kraftwerks und Grunddaten/AP3 Kraftwerke/windzonen'
-    filename = cfg.get('geometry', 'wind_zones')  # todo use dibt wind zones!!
-    wind_zones = geometries.load(path=path, filename=filename)
-    wind_zones.set_index('zone', inplace=True)
-
-    # create geopandas.DataFrame from register
-    register['coordinates'] = list(zip(register['lon'], register['lat']))
-    register['geometry'] = register['coordinates'].apply(Point)
-    gdf_register = gpd.GeoDataFrame(register, geometry='geometry')
-    # add wind zones by sjoin
-    jgdf = gpd.sjoin(gdf_register, wind_zones, how='left', op='within').rename(
-        columns={'index_right': 'wind_zone'})
-    adapted_register = pd.DataFrame(jgdf).drop(['coordinates',
-                                                'geometry'], axis=1)
-
-    # add data of typical turbine types to wind zones
-    wind_zones['name'] = [cfg.get('wind_set{}'.format(wind_zone), 'name')
-                          for wind_zone in wind_zones.index]
-    wind_zones['hub_height'] = [
-        int(cfg.get('wind_set{}'.format(wind_zone), 'hub_height'))
-        for wind_zone in wind_zones.index]
-    wind_zones['rotor_diameter'] = [
-        int(cfg.get('wind_set{}'.format(wind_zone), 'rotor_diameter'))
-        for wind_zone in wind_zones.index]
-    wind_zones['id'] = [
-        cfg.get('wind_set{}'.format(wind_zone), 'set_name')
-        for wind_zone in wind_zones.index]  # todo with less code
+    if wind_zones is None:
+        # path = cfg.get('paths', 'geometry')
+        path = '/home/sabine/rl-institut/04_Projekte/163_Open_FRED/03-Projektinhalte/AP3 4 Kraftwerks und Grunddaten/AP3 Kraftwerke/windzonen'
+        filename = cfg.get('geometry', 'wind_zones')  # todo use dibt wind zones!!
+        wind_zones = load_wind_zones(path=path, filename=filename)
+        key = wind_zones.attrs['geometry_key']
+    else:
+        wind_zones = wind_zones.set_index('zone')
+        key = None
+
+    # add wind zones
+    zones = get_wind_zones_of_locations(
+        register['lon'].values, register['lat'].values, wind_zones, key=key)
+    adapted_register = register.loc[~np.isnan(zones)].copy()
+    adapted_register['wind_zone'] = zones[~np.isnan(zones)].astype(
+        wind_zones.index.dtype)
 
     # add data of typical turbine types by wind zone to power plant register
-    adapted_register = pd.merge(adapted_register, wind_zones[
-        ['name', 'hub_height', 'rotor_diameter', 'id']], how='inner',
-                                left_on='wind_zone', right_index=True)
+    turbine_sets = get_turbine_sets(tuple(wind_zones.index))
+    positions = turbine_sets.index.get_indexer(adapted_register['wind_zone'])
+    for column in turbine_sets.columns:
+        adapted_register[column] = turbine_sets[column].values[positions]
     return adapted_register
 
 
@@ -16,37 +16,56 @@ __license__ = "GPLv3"
 import pandas as pd
 import numpy as np
 import logging
+import operator
+import threading
+
+
+# columns added by prepare_dates() and needed by get_pp_by_year()
+DATE_COLUMNS = ['com_year', 'decom_year', 'com_month', 'decom_month']
+
+# factor between the memory of a register and the peak memory of assigning
+# its power plants to regions and filtering them by year, memory of the
+# shapely point of a power plant in bytes and number of power plants the
+# memory is estimated from (see get_chunk_size())
+CHUNK_MEMORY_FACTOR = 8
+POINT_MEMORY = 200
+CHUNK_SAMPLE_SIZE = 10000
+
+# operators of the filters of get_register_filters()
+FILTER_OPERATORS = {'==': operator.eq, '<=': operator.le, '>=': operator.ge}
 
 
 def prepare_dates(df, date_cols, month):
     r"""
     von Uwe
 
+    Every date column is parsed only once. The parsed dates replace the date
+    columns given as strings.
 
     """
-    # Commission year from float or string
-    if df[date_cols[0]].dtype == np.float64:
-        df['com_year'] = df[date_cols[0]].fillna(1800).astype(np.int64)
-    else:
-        df['com_year'] = pd.to_datetime(df[date_cols[0]].fillna(
-            '1800-01-01')).dt.year
-
-    # Decommission year from float or string
-    if df[date_cols[1]].dtype == np.float64:
-        df['decom_year'] = df[date_cols[1]].fillna(2050).astype(np.int64)
-    else:
-        df['decom_year'] = pd.to_datetime(df[date_cols[1]].fillna(
-            '2050-12-31')).dt.year
-
-    if month:
-        df['com_month'] = pd.to_datetime(df[date_cols[0]].fillna(
-            '1800-01-01')).dt.month
-        df['decom_month'] = pd.to_datetime(df[date_cols[1]].fillna(
-            '2050-12-31')).dt.month
-    else:
-        df['com_month'] = 6
-        df['decom_month'] = 6
-
+    for date_col, year_col, month_col, default in [
+            (date_cols[0], 'com_year', 'com_month', '1800-01-01'),
+            (date_cols[1], 'decom_year', 'decom_month', '2050-12-31')]:
+        default = pd.Timestamp(default)
+        if df[date_col].dtype == np.float64:
+            # Year from float, floats do not contain the month
+            df[year_col] = df[date_col].fillna(default.year).astype(np.int64)
+            dates = None
+        else:
+            dates = pd.to_datetime(df[date_col])
+            df[date_col] = dates
+            df[year_col] = dates.dt.year.fillna(default.year).astype(
+                np.int64)
+        if not month:
+            df[month_col] = 6
+        elif dates is None:
+            # the default date keeps its month, years given as floats are
+            # counted from January
+            df[month_col] = np.where(df[date_col].isnull().values,
+                                     default.month, 1)
+        else:
+            df[month_col] = dates.dt.month.fillna(default.month).astype(
+                np.int64)
     return df
 
 
@@ -65,7 +84,8 @@ def get_pp_by_year(year, register, overwrite_capacity=True):
     -------
 
     """
-    pp = pd.DataFrame(register)
+    # copy, so that the capacity of `register` is not overwritten
+    pp = pd.DataFrame(register).copy()
 
     filter_columns = ['capacity_{0}']
 
@@ -98,6 +118,397 @@ def get_pp_by_year(year, register, overwrite_capacity=True):
     return pp_filtered
 
 
+def get_capacity_matrix(register, years, freq='year', dtype=np.float64):
+    r"""
+    Returns the effective capacity of each power plant in each year or month.
+
+    The capacities of all years are calculated at once from the columns
+    :py:attr:`DATE_COLUMNS` without copying the register. The capacity of a
+    year is the capacity as in :py:func:`get_pp_by_year`: power plants are
+    counted from the month after the commissioning month and until the
+    decommissioning month. Power plants not running in a year have the
+    capacity 0.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register containing the column 'capacity' and the columns
+        :py:attr:`DATE_COLUMNS`.
+    years : list of int
+        Years of the capacities.
+    freq : string
+        Resolution of the capacities. Options: 'year', 'month'.
+        Default: 'year'.
+    dtype : numpy dtype
+        Type of the capacities. Default: np.float64.
+
+    Returns
+    -------
+    capacities : pd.DataFrame
+        Capacity of the power plants (rows, index of `register`) in the years
+        (columns, int) or months (columns, first day of the month).
+
+    """
+    capacity = register['capacity'].values.astype(dtype)[:, np.newaxis]
+    com_year = register['com_year'].values.astype(np.int32)[:, np.newaxis]
+    decom_year = register['decom_year'].values.astype(
+        np.int32)[:, np.newaxis]
+    com_month = register['com_month'].values.astype(np.int32)[:, np.newaxis]
+    decom_month = register['decom_month'].values.astype(
+        np.int32)[:, np.newaxis]
+    years = np.asarray(years, dtype=np.int32)
+    if freq == 'year':
+        factor = ((com_year < years) & (decom_year > years)).astype(dtype)
+        factor = np.where(com_year == years, (12 - com_month) / 12, factor)
+        factor = np.where(decom_year == years, decom_month / 12, factor)
+        columns = pd.Index(years, name='year')
+    elif freq == 'month':
+        # months are counted since year 0
+        months = (years[:, np.newaxis] * 12 + np.arange(12)).ravel()
+        factor = ((com_year * 12 + com_month - 1 < months) &
+                  (decom_year * 12 + decom_month - 1 >= months))
+        columns = pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({
+            'year': months // 12, 'month': months % 12 + 1, 'day': 1})),
+            name='month')
+    else:
+        raise ValueError("Invalid freq {}. ".format(freq) +
+                         "Choose from: 'year', 'month'.")
+    return pd.DataFrame((capacity * factor).astype(dtype, copy=False),
+                        index=register.index, columns=columns)
+
+
+def get_capacity_series(register, index, column=None):
+    r"""
+    Returns the installed capacity at each time step of `index`.
+
+    The capacity of a power plant is installed from the first day of the
+    month after its commissioning month until the last day of its
+    decommissioning month (see :py:func:`get_capacity_matrix`). The step
+    series are calculated at once for all power plants as cumulative sum of
+    the capacities added and removed at these events.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register containing the column 'capacity' and the columns
+        :py:attr:`DATE_COLUMNS`.
+    index : pd.DatetimeIndex
+        Time steps of the capacity series, for example of the weather data.
+        A timezone is ignored, the events are compared with the local time.
+    column : string or None
+        If given, the capacity is summed up per value of `column`, for
+        example per region. Otherwise the total capacity is returned.
+        Default: None.
+
+    Returns
+    -------
+    capacity : pd.DataFrame or pd.Series
+        Installed capacity with `index` as index and the values of `column` as
+        columns or, if `column` is None, total installed capacity.
+
+    """
+    if index.tz is not None:
+        times = index.tz_localize(None).values
+    else:
+        times = index.values
+    # months since 1970 of the first and of the first month after the last
+    # month the power plants are running in
+    start = (register['com_year'].values.astype(np.int64) - 1970) * 12 + (
+        register['com_month'].values.astype(np.int64))
+    end = (register['decom_year'].values.astype(np.int64) - 1970) * 12 + (
+        register['decom_month'].values.astype(np.int64))
+    start = np.searchsorted(times, start.astype('datetime64[M]').astype(
+        times.dtype))
+    end = np.searchsorted(times, end.astype('datetime64[M]').astype(
+        times.dtype))
+    if column is None:
+        codes, groups = np.zeros(len(register), dtype=np.int64), [None]
+    else:
+        codes, groups = pd.factorize(register[column], sort=True)
+    # power plants decommissioned before their commissioning are not counted
+    capacity = np.where(end > start,
+                        register['capacity'].values.astype(np.float64), 0)
+    events = np.zeros((len(times) + 1, len(groups)))
+    np.add.at(events, (start, codes), capacity)
+    np.add.at(events, (end, codes), -capacity)
+    capacity = np.cumsum(events[:-1], axis=0)
+    if column is None:
+        return pd.Series(capacity[:, 0], index=index, name='capacity')
+    return pd.DataFrame(capacity, index=index,
+                        columns=pd.Index(groups, name=column))
+
+
+def partition_register(register, column='nuts'):
+    r"""
+    Splits a power plant register into sub-registers by the values of `column`.
+
+    The register is grouped once, so that the power plants of a region can be
+    looked up instead of filtering the whole register for every region.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register containing `column`.
+    column : string
+        Column the register is partitioned by. Default: 'nuts'.
+
+    Returns
+    -------
+    partitions : dict
+        Sub-registers (pd.DataFrame) of `register` with the values of `column`
+        as keys. Values of `column` without power plants are not contained.
+
+    """
+    return dict(tuple(register.groupby(column, sort=False, observed=True)))
+
+
+def get_register_filters(energy_source=None, years=None, bbox=None,
+                         source_column='energy_source_level_2'):
+    r"""
+    Returns the filters selecting power plants of a register.
+
+    The filters can be pushed into reading a parquet file (see the `filters`
+    parameter of pd.read_parquet) or applied to a register with
+    :py:func:`filter_register`.
+
+    Parameters
+    ----------
+    energy_source : string or None
+        Energy source as in `source_column`. If None all energy sources are
+        selected. Default: None.
+    years : tuple or None
+        First and last year (int). Power plants running in at least one year
+        of the range are selected, that is power plants commissioned until
+        the last and decommissioned in or after the first year. If None all
+        years are selected. Default: None.
+    bbox : tuple or None
+        Bounding box (lon_min, lat_min, lon_max, lat_max) of the power plants.
+        If None all locations are selected. Default: None.
+    source_column : string
+        Column containing the energy source. Default: 'energy_source_level_2'.
+
+    Returns
+    -------
+    filters : list of tuples
+        Filters (column, operator, value) that are combined with "and". The
+        operators are keys of :py:attr:`FILTER_OPERATORS`.
+
+    """
+    filters = []
+    if energy_source is not None:
+        filters.append((source_column, '==', energy_source))
+    if years is not None:
+        first_year, last_year = years
+        filters += [('com_year', '<=', last_year),
+                    ('decom_year', '>=', first_year)]
+    if bbox is not None:
+        lon_min, lat_min, lon_max, lat_max = bbox
+        filters += [('lon', '>=', lon_min), ('lon', '<=', lon_max),
+                    ('lat', '>=', lat_min), ('lat', '<=', lat_max)]
+    return filters
+
+
+def filter_register(register, filters):
+    r"""
+    Returns the power plants of `register` matching all `filters`.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register.
+    filters : list of tuples
+        Filters (column, operator, value) as returned by
+        :py:func:`get_register_filters`.
+
+    """
+    if not filters:
+        return register
+    mask = np.ones(len(register), dtype=bool)
+    for column, op, value in filters:
+        mask &= FILTER_OPERATORS[op](register[column], value).values
+    return register.loc[mask]
+
+
+class RegisterStore(object):
+    r"""
+    Keeps a power plant register in memory partitioned by energy source.
+
+    The register is partitioned once (see :py:func:`partition_register`) or
+    the partitions are loaded on first use with `loader`. For every partition
+    the positions of the power plants sorted by commissioning and by
+    decommissioning year are determined on first use, so that the power
+    plants running in a year are found by binary search instead of comparing
+    the years of all power plants.
+
+    Parameters
+    ----------
+    register : pd.DataFrame or None
+        Power plant register containing `source_column` and the columns
+        :py:attr:`DATE_COLUMNS`. Default: None.
+    source_column : string
+        Column containing the energy source. Default: 'energy_source_level_2'.
+    loader : callable or None
+        Function returning the register of an energy source, which is called
+        once for energy sources that are not in the store. If None the store
+        only contains `register`. Default: None.
+
+    Attributes
+    ----------
+    partitions : dict
+        Sub-registers (pd.DataFrame) with the energy sources as keys.
+
+    """
+    def __init__(self, register=None, source_column='energy_source_level_2',
+                 loader=None):
+        self.source_column = source_column
+        self.loader = loader
+        if register is None:
+            self.partitions = {}
+        else:
+            self.partitions = partition_register(register,
+                                                 column=source_column)
+        # energy source -> dict with the sorted years and their positions
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def sources(self):
+        r"""
+        Energy sources in the store.
+
+        """
+        return list(self.partitions)
+
+    def get(self, source):
+        r"""
+        Returns the power plants of `source` of all years.
+
+        Returns
+        -------
+        register : pd.DataFrame
+            Sub-register of `source`. It is empty if there are no power plants
+            of `source`. Do not change it in place, as it is kept in the
+            store.
+
+        """
+        if source not in self.partitions and self.loader is not None:
+            with self._lock:
+                if source not in self.partitions:
+                    self.partitions[source] = self.loader(source)
+        if source not in self.partitions or self.partitions[source].empty:
+            logging.warning("No power plants with energy source {}.".format(
+                source))
+            return pd.DataFrame(columns=self._get_columns())
+        return self.partitions[source]
+
+    def get_pp_by_year(self, year, source):
+        r"""
+        Returns the power plants of `source` running in `year`.
+
+        The capacity of power plants commissioned or decommissioned in `year`
+        is reduced according to the month as in :py:func:`get_pp_by_year`.
+        Other than there, power plants decommissioned before `year` are not
+        contained.
+
+        Parameters
+        ----------
+        year : int
+        source : string
+            Energy source as in column `source_column` of the register.
+
+        Returns
+        -------
+        register : pd.DataFrame
+            Power plants of `source` running in `year` in the order of the
+            register.
+
+        """
+        register = self.get(source)
+        if register.empty:
+            return register.copy()
+        index = self._get_index(source)
+        # power plants commissioned until the end of `year`
+        commissioned = index['com_order'][:np.searchsorted(
+            index['com_year'], year, side='right')]
+        # minus the power plants decommissioned before `year`
+        decommissioned = index['decom_order'][:np.searchsorted(
+            index['decom_year'], year, side='left')]
+        selected = np.zeros(len(register), dtype=bool)
+        selected[commissioned] = True
+        selected[decommissioned] = False
+
+        capacity = register['capacity'].values.astype(np.float64)
+        factor = np.ones(len(register))
+        com = index['com_order'][
+            np.searchsorted(index['com_year'], year, side='left'):
+            np.searchsorted(index['com_year'], year, side='right')]
+        factor[com] = (12 - register['com_month'].values[com]) / 12
+        decom = index['decom_order'][
+            np.searchsorted(index['decom_year'], year, side='left'):
+            np.searchsorted(index['decom_year'], year, side='right')]
+        factor[decom] = register['decom_month'].values[decom] / 12
+
+        positions = np.flatnonzero(selected)
+        register_year = register.iloc[positions].copy()
+        register_year['capacity'] = capacity[positions] * factor[positions]
+        return register_year
+
+    def _get_index(self, source):
+        if source not in self._indexes:
+            register = self.partitions[source]
+            com_order = np.argsort(register['com_year'].values, kind='stable')
+            decom_order = np.argsort(register['decom_year'].values,
+                                     kind='stable')
+            self._indexes[source] = {
+                'com_order': com_order,
+                'com_year': register['com_year'].values[com_order],
+                'decom_order': decom_order,
+                'decom_year': register['decom_year'].values[decom_order]}
+        return self._indexes[source]
+
+    def _get_columns(self):
+        for register in self.partitions.values():
+            return register.columns
+        return []
+
+
+def get_chunk_size(register, max_memory):
+    r"""
+    Returns the number of power plants per chunk for a memory cap.
+
+    The memory needed per power plant for assigning the power plants to
+    regions and filtering them by year is estimated from the memory of the
+    first :py:attr:`CHUNK_SAMPLE_SIZE` rows of `register`.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register.
+    max_memory : float
+        Memory in MB the power plants of a chunk may need.
+
+    Returns
+    -------
+    chunk_size : int
+        Number of power plants per chunk (at least 1).
+
+    """
+    sample = register.iloc[:CHUNK_SAMPLE_SIZE]
+    bytes_per_plant = (
+        CHUNK_MEMORY_FACTOR * sample.memory_usage(deep=True).sum() /
+        max(len(sample), 1) + POINT_MEMORY)
+    return max(int(max_memory * 1e6 / bytes_per_plant), 1)
+
+
+def iter_chunks(register, chunk_size):
+    r"""
+    Yields consecutive chunks of `register` with `chunk_size` power plants.
+
+    """
+    for start in range(0, len(register), chunk_size):
+        yield register.iloc[start:start + chunk_size]
+
+
 def remove_pp_with_missing_coordinates(register, category, register_name):
     r"""
     Removes power plants with missing coordinates from register.
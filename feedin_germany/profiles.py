@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+The `profiles` module contains functions for calculating feed-in time series
+of regions from normalized feed-in profiles.
+
+Instead of calculating the feed-in of every power plant, the normalized
+feed-in (feed-in per installed capacity) is calculated once for every
+combination of technology set and weather location in a register. The feed-in
+of a region is the sum of these profiles weighted with the installed capacity
+of the region's power plants. Optionally the installed capacity changes at
+every time step with the commissioning and decommissioning of the power
+plants (see :py:func:`aggregate_profiles_time_resolved`).
+
+For solar power plants a profile is calculated for every pv module set (see
+:py:func:`~.pv_modules.create_pvmodule_dict`) at every weather location. The
+profiles of the module sets are mixed once by the distribution of the module
+sets and stored next to the weather data, so that all regions and years
+sharing the weather data use the same mixed profiles.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import pvlib
+from feedinlib import tools
+from windpowerlib.wind_turbine import WindTurbine
+from windpowerlib.modelchain import ModelChain
+
+# internal imports
+from feedin_germany import file_tools
+from feedin_germany import power_plant_register_tools as ppr_tools
+from feedin_germany.weather import open_weather_store
+
+
+# columns of the register containing the location of the weather data point
+# next to a power plant (as added by feedinlib.tools)
+WEATHER_LOCATION_COLUMNS = ['weather_lat', 'weather_lon']
+
+# columns of a wind power plant register specifying the turbine
+TURBINE_COLUMNS = ['id', 'hub_height']
+
+# temperature model of the pv modules if not given in the pv module set
+PV_TEMPERATURE_MODEL = 'open_rack_glass_glass'
+
+
+def add_weather_locations(register, weather):
+    r"""
+    Adds the location of the nearest weather data point to `register`.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register with power plants' locations in columns 'lat'
+        and 'lon'.
+    weather : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon).
+
+    Returns
+    -------
+    register : pd.DataFrame
+        `register` with additional columns 'weather_lat' and 'weather_lon'.
+        If these columns already exist `register` is returned unchanged.
+
+    """
+    if set(WEATHER_LOCATION_COLUMNS).issubset(register.columns):
+        return register
+    if isinstance(weather.columns, pd.MultiIndex):
+        weather_coordinates = weather[weather.columns.levels[0][0]]
+    else:
+        weather_coordinates = weather
+    return tools.add_weather_locations_to_register(
+        register=register, weather_coordinates=weather_coordinates)
+
+
+def get_weather_of_location(weather, lat, lon):
+    r"""
+    Selects the weather data of one weather data point.
+
+    Parameters
+    ----------
+    weather : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon) or with time index and
+        the location in columns 'lat' and 'lon'.
+    lat : float
+        Latitude of the weather data point.
+    lon : float
+        Longitude of the weather data point.
+
+    Returns
+    -------
+    pd.DataFrame
+        Weather data of the weather data point with time index.
+
+    """
+    if isinstance(weather.index, pd.MultiIndex):
+        return weather.xs((lat, lon), level=[1, 2])
+    return weather.loc[(weather['lat'] == lat) & (weather['lon'] == lon)]
+
+
+def get_weather_locations(weather):
+    r"""
+    Returns the locations of the weather data points.
+
+    Parameters
+    ----------
+    weather : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon) or with time index and
+        the location in columns 'lat' and 'lon'.
+
+    Returns
+    -------
+    pd.MultiIndex
+        Unique locations with levels 'weather_lat' and 'weather_lon'.
+
+    """
+    if isinstance(weather.index, pd.MultiIndex):
+        locations = weather.index.droplevel(0).unique()
+    else:
+        locations = pd.MultiIndex.from_frame(
+            weather[['lat', 'lon']].drop_duplicates())
+    return locations.set_names(WEATHER_LOCATION_COLUMNS)
+
+
+def calculate_wind_profiles(register, weather, fetch_curve='power_curve',
+                            profiles=None, **kwargs):
+    r"""
+    Calculates normalized feed-in of each turbine type at each weather point.
+
+    The feed-in is calculated once for every unique combination of turbine
+    ('id', 'hub_height') and weather location in `register` with the
+    windpowerlib and divided by the nominal power of the turbine.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Wind power plant register with turbine data as added by
+        :py:func:`~.opsd_power_plants.assign_turbine_data_by_wind_zone` and
+        weather locations as added by :py:func:`add_weather_locations`.
+    weather : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon) in the format needed by
+        the windpowerlib.
+    fetch_curve : string
+        Curve of the turbine fetched from the oedb. Default: 'power_curve'.
+    profiles : dict or None
+        Profiles calculated before with `weather`, for example for other
+        chunks of a register, as pd.Series with tuples of the turbine columns
+        and the weather location columns as keys. Only the missing profiles
+        are calculated and they are added to `profiles`. Default: None.
+
+    Other parameters
+    ----------------
+    Passed to windpowerlib's ModelChain.
+
+    Returns
+    -------
+    profiles : pd.DataFrame
+        Normalized feed-in time series of the power plants in `register`.
+        Columns are a MultiIndex of the turbine columns and the weather
+        location columns.
+
+    """
+    key_columns = TURBINE_COLUMNS + WEATHER_LOCATION_COLUMNS
+    keys = register[key_columns + ['name', 'rotor_diameter']].drop_duplicates(
+        subset=key_columns)
+    if profiles is None:
+        profiles = {}
+    key_tuples = [tuple(key) for key in keys[key_columns].values]
+    keys = keys.loc[[key not in profiles for key in key_tuples]]
+    logging.debug("Calculating {} wind profiles for {} power plants.".format(
+        len(keys), len(register)))
+    for (turbine_id, hub_height), turbine_keys in keys.groupby(
+            TURBINE_COLUMNS):
+        turbine_data = turbine_keys.iloc[0]
+        turbine = WindTurbine(
+            name=turbine_data['name'], hub_height=hub_height,
+            rotor_diameter=turbine_data['rotor_diameter'],
+            fetch_curve=fetch_curve)
+        for lat, lon in turbine_keys[WEATHER_LOCATION_COLUMNS].values:
+            power_output = ModelChain(turbine, **kwargs).run_model(
+                get_weather_of_location(weather, lat, lon)).power_output
+            profiles[(turbine_id, hub_height, lat, lon)] = (
+                power_output / turbine.nominal_power)
+    profiles = pd.DataFrame({key: profiles[key] for key in key_tuples})
+    profiles.columns.names = key_columns
+    profiles.index.name = 'time'
+    return profiles
+
+
+def create_capacity_matrix(register, keys, region_column='nuts'):
+    r"""
+    Creates a sparse matrix of the installed capacity per region and profile.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register with capacity in column 'capacity', the region
+        in `region_column` and the columns named like the levels of `keys`.
+    keys : pd.MultiIndex
+        Keys of the profiles, for example the columns of the profiles returned
+        by :py:func:`calculate_wind_profiles`.
+    region_column : string
+        Column of `register` containing the region. Default: 'nuts'.
+
+    Returns
+    -------
+    tuple(scipy.sparse.csr_matrix, pd.Index)
+        Matrix of the installed capacity with regions as rows and `keys` as
+        columns and the regions in the order of the matrix rows.
+
+    """
+    region_codes, regions = pd.factorize(register[region_column], sort=True)
+    key_codes = keys.get_indexer(
+        pd.MultiIndex.from_frame(register[list(keys.names)]))
+    if (key_codes < 0).any():
+        raise ValueError(
+            "No profiles for {} power plants in `register`.".format(
+                (key_codes < 0).sum()))
+    # capacities of power plants with the same region and key are summed up
+    matrix = sparse.csr_matrix(
+        (register['capacity'].values, (region_codes, key_codes)),
+        shape=(len(regions), len(keys)))
+    return matrix, pd.Index(regions, name=region_column)
+
+
+def aggregate_profiles(register, profiles, region_column='nuts'):
+    r"""
+    Calculates the feed-in of regions as capacity weighted sum of profiles.
+
+    The feed-in of all regions is calculated with one product of the profiles
+    and a sparse (region x profile) capacity matrix (see
+    :py:func:`create_capacity_matrix`), so that the effort depends on the
+    number of profiles and not on the number of power plants per region.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register with capacity in column 'capacity', the region
+        in `region_column` and the columns named like the column levels of
+        `profiles`.
+    profiles : pd.DataFrame
+        Normalized feed-in time series as returned by
+        :py:func:`calculate_wind_profiles`.
+    region_column : string
+        Column of `register` containing the region. Default: 'nuts'.
+
+    Returns
+    -------
+    feedin : pd.DataFrame
+        Feed-in time series with regions as columns.
+
+    """
+    capacity_matrix, regions = create_capacity_matrix(
+        register, keys=profiles.columns, region_column=region_column)
+    return pd.DataFrame(capacity_matrix.dot(profiles.values.T).T,
+                        index=profiles.index, columns=regions)
+
+
+def aggregate_profiles_time_resolved(register, profiles, region_column='nuts'):
+    r"""
+    Calculates the feed-in of regions as sum of profiles weighted with the
+    installed capacity at each time step.
+
+    For every region the installed capacity of each profile is a step series
+    (see :py:func:`~.power_plant_register_tools.get_capacity_series`), so
+    that power plants only feed in after they were commissioned and until
+    they are decommissioned. The feed-in of a region is one product of its
+    capacity series and profiles.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Power plant register with capacity in column 'capacity', the region
+        in `region_column`, the columns
+        :py:attr:`~.power_plant_register_tools.DATE_COLUMNS` and the columns
+        named like the column levels of `profiles`. The capacities are not
+        scaled by year.
+    profiles : pd.DataFrame
+        Normalized feed-in time series as returned by
+        :py:func:`calculate_wind_profiles`.
+    region_column : string
+        Column of `register` containing the region. Default: 'nuts'.
+
+    Returns
+    -------
+    feedin : pd.DataFrame
+        Feed-in time series with regions as columns.
+
+    """
+    key_codes = profiles.columns.get_indexer(
+        pd.MultiIndex.from_frame(register[list(profiles.columns.names)]))
+    if (key_codes < 0).any():
+        raise ValueError(
+            "No profiles for {} power plants in `register`.".format(
+                (key_codes < 0).sum()))
+    register = register.assign(profile=key_codes)
+    feedin = {}
+    for region, register_region in sorted(ppr_tools.partition_register(
+            register, column=region_column).items()):
+        capacity = ppr_tools.get_capacity_series(
+            register_region, profiles.index, column='profile')
+        feedin[region] = np.einsum(
+            'ij,ij->i', capacity.values,
+            profiles.values[:, capacity.columns.values])
+    return pd.DataFrame(feedin, index=profiles.index,
+                        columns=pd.Index(list(feedin), name=region_column))
+
+
+def calculate_wind_feedin_by_turbine_type(register, weather,
+                                          time_resolved_capacity=False,
+                                          **kwargs):
+    r"""
+    Calculates the wind feed-in of regions from turbine type profiles.
+
+    The normalized feed-in of each turbine type at each weather location is
+    calculated only once (see :py:func:`calculate_wind_profiles`) and scaled
+    by the capacity of the power plants in each region.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Wind power plant register with region in column 'nuts' and turbine
+        data as added by
+        :py:func:`~.opsd_power_plants.assign_turbine_data_by_wind_zone`.
+    weather : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon) in the format needed by
+        the windpowerlib.
+    time_resolved_capacity : boolean
+        If True the installed capacity changes at every time step (see
+        :py:func:`aggregate_profiles_time_resolved`). Default: False.
+
+    Other parameters
+    ----------------
+    Passed to :py:func:`calculate_wind_profiles`.
+
+    Returns
+    -------
+    feedin : pd.DataFrame
+        Feed-in time series in W with nuts of the regions as columns.
+
+    """
+    register = add_weather_locations(register, weather)
+    profiles = calculate_wind_profiles(register, weather, **kwargs)
+    if time_resolved_capacity:
+        return aggregate_profiles_time_resolved(register, profiles,
+                                                region_column='nuts')
+    return aggregate_profiles(register, profiles, region_column='nuts')
+
+
+def calculate_pv_module_profiles(weather, pv_modules_set, locations=None,
+                                 **kwargs):
+    r"""
+    Calculates normalized feed-in of each pv module set at each weather point.
+
+    The AC feed-in of one module is calculated with the pvlib and divided by
+    the peak power of the module (limited by the inverter's AC power).
+
+    Parameters
+    ----------
+    weather : pd.DataFrame
+        Solar weather data as read by :py:func:`~.weather.read_open_fred_csv`
+        with columns 'wind_speed', 'temp_air', 'dhi' and 'ghi'.
+    pv_modules_set : dict
+        Pv module sets as returned by
+        :py:func:`~.pv_modules.create_pvmodule_dict`.
+    locations : pd.MultiIndex or None
+        Weather locations the profiles are calculated for. If None the
+        profiles are calculated for all locations in `weather` (see
+        :py:func:`get_weather_locations`). Default: None.
+
+    Other parameters
+    ----------------
+    Passed to pvlib's ModelChain.
+
+    Returns
+    -------
+    profiles : pd.DataFrame
+        Normalized feed-in time series. Columns are a MultiIndex of the name
+        of the pv module set and the weather location columns.
+
+    """
+    if locations is None:
+        locations = get_weather_locations(weather)
+    modules = pvlib.pvsystem.retrieve_sam('sandiamod')
+    inverters = pvlib.pvsystem.retrieve_sam('cecinverter')
+    logging.debug("Calculating {} pv profiles.".format(
+        len(pv_modules_set) * len(locations)))
+    profiles = {}
+    for lat, lon in locations:
+        weather_location = get_weather_of_location(weather, lat, lon)
+        location = pvlib.location.Location(latitude=lat, longitude=lon,
+                                           tz=weather_location.index.tz)
+        # the open_FRED data contains direct horizontal instead of direct
+        # normal irradiance, which is calculated once per location
+        zenith = location.get_solarposition(
+            weather_location.index)['zenith']
+        weather_location = weather_location[
+            ['wind_speed', 'temp_air', 'dhi', 'ghi']].assign(
+            dni=pvlib.irradiance.dni(weather_location['ghi'],
+                                     weather_location['dhi'],
+                                     zenith).fillna(0))
+        for set_name, pv_module in pv_modules_set.items():
+            module_parameters = modules[pv_module['module_name']]
+            inverter_parameters = inverters[pv_module['inverter_name']]
+            system = pvlib.pvsystem.PVSystem(
+                surface_tilt=pv_module['tilt'],
+                surface_azimuth=pv_module['azimuth'],
+                albedo=pv_module['albedo'],
+                module_parameters=module_parameters,
+                inverter_parameters=inverter_parameters,
+                temperature_model_parameters=(
+                    pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm'][
+                        pv_module.get('temperature_model',
+                                      PV_TEMPERATURE_MODEL)]))
+            model_chain = pvlib.modelchain.ModelChain(system, location,
+                                                      **kwargs)
+            model_chain.run_model(weather=weather_location)
+            peak_power = min(
+                module_parameters['Impo'] * module_parameters['Vmpo'],
+                inverter_parameters['Paco'])
+            # the pvlib returns nan if there is no irradiance
+            profiles[(set_name, lat, lon)] = (
+                model_chain.results.ac.fillna(0) / peak_power)
+    profiles = pd.DataFrame(profiles)
+    profiles.columns.names = ['pv_set'] + WEATHER_LOCATION_COLUMNS
+    profiles.index.name = 'time'
+    return profiles
+
+
+def mix_pv_profiles(profiles, distribution_dict):
+    r"""
+    Mixes the profiles of the pv module sets by their distribution.
+
+    Parameters
+    ----------
+    profiles : pd.DataFrame
+        Normalized feed-in time series as returned by
+        :py:func:`calculate_pv_module_profiles`.
+    distribution_dict : dict
+        Share of each pv module set as returned by
+        :py:func:`~.pv_modules.create_distribution_dict`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Normalized feed-in time series with the weather location columns as
+        columns.
+
+    """
+    pv_sets = list(distribution_dict)
+    locations = profiles.columns.droplevel(0).unique()
+    values = profiles.reindex(columns=pd.MultiIndex.from_tuples(
+        [(pv_set, lat, lon) for pv_set in pv_sets
+         for lat, lon in locations], names=profiles.columns.names)).values
+    if np.isnan(values).all(axis=0).any():
+        raise ValueError("No profiles for all pv module sets in "
+                         "`distribution_dict`.")
+    # weighted sum of the module sets as one (time x set x location) by
+    # (set) product
+    weights = np.array([float(distribution_dict[pv_set])
+                        for pv_set in pv_sets])
+    mixed = np.tensordot(
+        values.reshape(len(profiles), len(pv_sets), len(locations)),
+        weights, axes=([1], [0]))
+    return pd.DataFrame(mixed, index=profiles.index, columns=locations)
+
+
+def get_pv_profiles(weather_store, pv_modules_set, distribution_dict,
+                    **kwargs):
+    r"""
+    Returns the mixed pv profiles of all locations of a weather store.
+
+    The profiles are calculated at the first call and stored in the
+    directory of the weather store keyed by `pv_modules_set`,
+    `distribution_dict` and `kwargs`.
+
+    Parameters
+    ----------
+    weather_store : string
+        Directory of the weather store (see
+        :py:func:`~.weather.get_weather_store`).
+    pv_modules_set : dict
+        Pv module sets as returned by
+        :py:func:`~.pv_modules.create_pvmodule_dict`.
+    distribution_dict : dict
+        Share of each pv module set as returned by
+        :py:func:`~.pv_modules.create_distribution_dict`.
+
+    Other parameters
+    ----------------
+    Passed to :py:func:`calculate_pv_module_profiles`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Normalized feed-in time series as returned by
+        :py:func:`mix_pv_profiles`.
+
+    """
+    key = hashlib.sha1(json.dumps(
+        [pv_modules_set, distribution_dict, kwargs], sort_keys=True,
+        default=str).encode('utf-8')).hexdigest()
+    filename = os.path.join(weather_store,
+                            'pv_profiles_{}.pkl'.format(key[:16]))
+    if os.path.isfile(filename):
+        return pd.read_pickle(filename)
+    profiles = mix_pv_profiles(
+        calculate_pv_module_profiles(open_weather_store(weather_store),
+                                     pv_modules_set, **kwargs),
+        distribution_dict)
+    with file_tools.write_atomically(filename) as tmp_filename:
+        profiles.to_pickle(tmp_filename)
+    return profiles
+
+
+def calculate_pv_feedin_by_module_set(register, weather, pv_profiles,
+                                      time_resolved_capacity=False):
+    r"""
+    Calculates the solar feed-in of regions from mixed pv profiles.
+
+    Parameters
+    ----------
+    register : pd.DataFrame
+        Solar power plant register with region in column 'nuts' and the
+        capacity in W in column 'capacity'.
+    weather : pd.DataFrame
+        Solar weather data the profiles were calculated with.
+    pv_profiles : pd.DataFrame
+        Normalized feed-in time series as returned by
+        :py:func:`mix_pv_profiles` or :py:func:`get_pv_profiles`.
+    time_resolved_capacity : boolean
+        If True the installed capacity changes at every time step (see
+        :py:func:`aggregate_profiles_time_resolved`). Default: False.
+
+    Returns
+    -------
+    feedin : pd.DataFrame
+        Feed-in time series in W with nuts of the regions as columns.
+
+    """
+    register = add_weather_locations(register, weather)
+    if time_resolved_capacity:
+        return aggregate_profiles_time_resolved(register, pv_profiles,
+                                                region_column='nuts')
+    return aggregate_profiles(register, pv_profiles, region_column='nuts')
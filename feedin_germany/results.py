@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+The `results` module contains classes for collecting calculated feed-in time
+series of regions in memory, writing them to sinks like files or caching them
+for later calculations.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import os
+import glob
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+# internal imports
+from feedin_germany import file_tools
+
+
+class FeedinAccumulator(object):
+    r"""
+    Collects feed-in time series of regions in preallocated arrays.
+
+    The feed-in of each technology is written in place into a time x region
+    array that is allocated once for `n_regions` regions (and enlarged if more
+    regions are added). The data frames in the database or deflex format are
+    only created at the end by :py:meth:`to_db_format` and
+    :py:meth:`to_deflex_format`, which avoids copying all previous results
+    every time a region is added.
+
+    Parameters
+    ----------
+    n_regions : int
+        Expected number of regions per technology. Default: 1.
+    reduce : boolean
+        If True feed-in added for a region that has already been added is
+        summed up with the existing feed-in, for example to reduce partial
+        feed-in of chunks of a register. Otherwise each added feed-in is
+        collected separately. Default: False.
+
+    """
+    def __init__(self, n_regions=1, reduce=False):
+        self.n_regions = max(int(n_regions), 1)
+        self.reduce = reduce
+        # technology -> dict with time 'index', 'data' array, 'nuts' list and
+        # 'columns' dict with the column of each nuts
+        self._blocks = {}
+
+    def add(self, feedin, technology, nuts):
+        r"""
+        Adds the feed-in time series of one region.
+
+        Parameters
+        ----------
+        feedin : pd.Series
+            Feed-in time series with datetime index. All time series of one
+            `technology` must have the same index.
+        technology : string
+            Technology the feed-in origins from, for example 'Wind'.
+        nuts : string
+            Nuts of the region.
+
+        """
+        block = self._blocks.get(technology)
+        if block is None:
+            block = {'index': feedin.index, 'nuts': [], 'columns': {},
+                     'data': np.empty((len(feedin), self.n_regions))}
+            self._blocks[technology] = block
+        elif not block['index'].equals(feedin.index):
+            raise ValueError(
+                "Feed-in of region {} has a different time index ".format(
+                    nuts) + "than the {} feed-in added before.".format(
+                    technology))
+        if self.reduce and nuts in block['columns']:
+            block['data'][:, block['columns'][nuts]] += feedin.values
+            return
+        column = len(block['nuts'])
+        if column == block['data'].shape[1]:
+            # enlarge array by doubling its number of columns
+            block['data'] = np.concatenate(
+                [block['data'], np.empty_like(block['data'])], axis=1)
+        block['data'][:, column] = feedin.values
+        block['nuts'].append(nuts)
+        block['columns'].setdefault(nuts, column)
+
+    def get(self, technology, nuts):
+        r"""
+        Returns the feed-in of one region.
+
+        Returns
+        -------
+        feedin : pd.Series or None
+            Feed-in time series named 'feedin' or None if no feed-in of
+            `technology` and `nuts` was added. If the feed-in of a region was
+            added several times (and `reduce` is False) the first one is
+            returned.
+
+        """
+        block = self._blocks.get(technology)
+        if block is None or nuts not in block['columns']:
+            return None
+        return pd.Series(block['data'][:, block['columns'][nuts]].copy(),
+                         index=block['index'], name='feedin')
+
+    def __len__(self):
+        return sum(len(block['nuts']) for block in self._blocks.values())
+
+    def to_db_format(self):
+        r"""
+        Returns the collected feed-in in the database format.
+
+        Returns
+        -------
+        feedin_df : pd.DataFrame
+            Feed-in of all regions and technologies in the order they were
+            added, with columns 'time', 'feedin', 'nuts' and 'technology' as
+            returned by :py:func:`~.feedin.feedin_to_db_format`.
+
+        """
+        frames = []
+        for technology, block in self._blocks.items():
+            n_nuts = len(block['nuts'])
+            positions = np.tile(np.arange(len(block['index'])), n_nuts)
+            frames.append(pd.DataFrame(
+                {'time': block['index'].take(positions),
+                 'feedin': block['data'][:, :n_nuts].ravel(order='F'),
+                 'nuts': np.repeat(block['nuts'], len(block['index'])),
+                 'technology': technology},
+                index=positions))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames)
+
+    def to_deflex_format(self):
+        r"""
+        Returns the collected feed-in in the format needed by deflex.
+
+        Returns
+        -------
+        deflex_feedin : pd.DataFrame
+            Feed-in with time index and MultiIndex columns. First level
+            columns contain nuts of regions, second level columns contain the
+            technology in lower case. Columns are sorted like in
+            :py:func:`~.feedin.form_feedin_for_deflex`.
+
+        """
+        frames = []
+        for technology, block in self._blocks.items():
+            n_nuts = len(block['nuts'])
+            columns = pd.MultiIndex.from_arrays(
+                [block['nuts'], [technology.lower()] * n_nuts])
+            frames.append(pd.DataFrame(block['data'][:, :n_nuts],
+                                       index=block['index'], columns=columns))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1).sort_index(axis=1)
+
+
+class FeedinSink(object):
+    r"""
+    Base class of sinks the feed-in of regions is written to while it is
+    calculated.
+
+    A sink receives the feed-in of each region in the database format (see
+    :py:func:`~.feedin.feedin_to_db_format`) as soon as it is calculated.
+    Sinks have to implement :py:meth:`write`.
+
+    """
+    def write(self, feedin_df, year, technology, nuts):
+        r"""
+        Writes the feed-in of one region.
+
+        Parameters
+        ----------
+        feedin_df : pd.DataFrame
+            Feed-in of the region in the database format.
+        year : int
+            Year of the feed-in.
+        technology : string
+            Technology the feed-in origins from, for example 'Wind'.
+        nuts : string
+            Nuts of the region.
+
+        """
+        raise NotImplementedError
+
+
+class PartitionedFileSink(FeedinSink):
+    r"""
+    Writes the feed-in of each region into a separate file.
+
+    The files are partitioned by year, technology and nuts:
+    `<path>/year=<year>/technology=<technology>/nuts=<nuts>.<file_format>`.
+    As every file is written as soon as the feed-in of a region is
+    calculated, the memory needed does not depend on the number of regions
+    and years.
+
+    Parameters
+    ----------
+    path : string
+        Directory the files are written to.
+    file_format : string
+        Format of the files. 'parquet' (columnar, needs pyarrow or
+        fastparquet) or 'csv'. Default: 'parquet'.
+
+    """
+    def __init__(self, path, file_format='parquet'):
+        if file_format not in ['parquet', 'csv']:
+            raise ValueError("Invalid file_format {}. ".format(file_format) +
+                             "Choose from: 'parquet', 'csv'.")
+        self.path = path
+        self.file_format = file_format
+
+    def get_filename(self, year, technology, nuts):
+        r"""
+        Returns the file name of the feed-in of one region.
+
+        """
+        return os.path.join(
+            self.path, 'year={}'.format(year),
+            'technology={}'.format(technology),
+            'nuts={}.{}'.format(nuts, self.file_format))
+
+    def write(self, feedin_df, year, technology, nuts):
+        filename = self.get_filename(year, technology, nuts)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with file_tools.write_atomically(filename) as tmp_filename:
+            if self.file_format == 'parquet':
+                feedin_df.to_parquet(tmp_filename, index=False)
+            else:
+                feedin_df.to_csv(tmp_filename, index=False)
+        logging.debug("Feed-in of region {} written to {}.".format(
+            nuts, filename))
+
+    def read(self, year='*', technology='*', nuts='*'):
+        r"""
+        Reads the feed-in written to the sink.
+
+        Parameters
+        ----------
+        year : int or string
+            Year of the feed-in. Default: '*' (all years).
+        technology : string
+            Technology of the feed-in. Default: '*' (all technologies).
+        nuts : string
+            Nuts of the region. Default: '*' (all regions).
+
+        Returns
+        -------
+        feedin_df : pd.DataFrame
+            Feed-in in the database format with an additional column 'year'.
+
+        """
+        frames = []
+        for filename in sorted(glob.glob(self.get_filename(
+                year, technology, nuts))):
+            if self.file_format == 'parquet':
+                df = pd.read_parquet(filename)
+            else:
+                df = pd.read_csv(filename, parse_dates=['time'])
+            df['year'] = int(os.path.basename(os.path.dirname(
+                os.path.dirname(filename))).split('=')[1])
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+class FeedinCache(object):
+    r"""
+    Content-addressed store of the feed-in time series of regions.
+
+    The feed-in of a region is stored under a key that is a hash of all
+    inputs of its calculation: the region's power plants, the weather data,
+    the technical parameters, the category and the year (see
+    :py:meth:`get_key`). If one of the inputs changes, the key changes and the
+    feed-in is calculated again, otherwise the stored time series is used.
+
+    Parameters
+    ----------
+    path : string
+        Directory the time series are stored in.
+
+    """
+    # columns of the register that are derived from other columns or depend
+    # on the order of the regions and are not hashed
+    ignore_columns = ['Coordinates', 'geometry', 'index_right']
+
+    # increase to invalidate all stored feed-in, for example if the
+    # calculation changes
+    version = 1
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_key(self, register_region, year, category, weather=None,
+                parameters=None):
+        r"""
+        Returns the key of the feed-in of one region.
+
+        The power plants of the region are hashed row by row. The hashes are
+        sorted, so that the key does not depend on the order of the power
+        plants.
+
+        Parameters
+        ----------
+        register_region : pd.DataFrame
+            Power plants of the region.
+        year : int
+            Year of the feed-in.
+        category : string
+            Energy source category of the power plants.
+        weather : string or None
+            Identifier of the weather data, for example the name of the
+            content-addressed weather store (see
+            :py:func:`~.weather.get_weather_store`). Default: None.
+        parameters : dict or None
+            Further parameters of the calculation. Must be serializable to
+            json, other values are converted to strings. Default: None.
+
+        Returns
+        -------
+        key : string
+            Hexadecimal sha1 hash.
+
+        """
+        columns = sorted(column for column in register_region.columns
+                         if column not in self.ignore_columns)
+        row_hashes = np.sort(pd.util.hash_pandas_object(
+            register_region[columns], index=False).values)
+        key = hashlib.sha1(json.dumps(
+            [self.version, category, year, weather, parameters, columns],
+            sort_keys=True, default=str).encode('utf-8'))
+        key.update(row_hashes.tobytes())
+        return key.hexdigest()
+
+    def get_filename(self, key):
+        r"""
+        Returns the file name of the feed-in stored under `key`.
+
+        """
+        return os.path.join(self.path, key[:2], '{}.pkl'.format(key))
+
+    def load(self, key):
+        r"""
+        Loads the feed-in stored under `key`.
+
+        Returns
+        -------
+        feedin : pd.Series or None
+            Feed-in time series or None if nothing is stored under `key`.
+
+        """
+        filename = self.get_filename(key)
+        if not os.path.isfile(filename):
+            return None
+        return pd.read_pickle(filename)
+
+    def store(self, key, feedin):
+        r"""
+        Stores the feed-in time series `feedin` under `key`.
+
+        """
+        filename = self.get_filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with file_tools.write_atomically(filename) as tmp_filename:
+            pd.to_pickle(feedin, tmp_filename)
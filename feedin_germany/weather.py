@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+The `weather` module contains functions for loading weather data needed for
+the feed-in calculations.
+
+Parsing the open_FRED csv files is slow. Therefore the weather data of a file
+and year is converted once into a weather store: a directory with the values
+as float32 array (time x location x variable) in npy format and the time
+index, locations and variables as metadata. The store is opened memory-mapped,
+so that opening it is fast and worker processes share the pages of the file.
+
+"""
+
+__copyright__ = "Copyright oemof developer group"
+__license__ = "GPLv3"
+
+# imports
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from feedinlib import tools
+
+# internal imports
+from feedin_germany import config as cfg
+from feedin_germany import file_tools
+
+
+def get_weather_filename(category):
+    r"""
+    Returns the open_FRED csv file of `category` from feedin_germany.ini.
+
+    """
+    return os.path.abspath(cfg.get(
+        'weather', 'open_fred_{}'.format(category.lower())))
+
+
+def read_open_fred_csv(filename, category):
+    r"""
+    Reads weather data from an open_FRED csv file.
+
+    Parameters
+    ----------
+    filename : string
+        Path to the csv file.
+    category : string
+        Energy source category the weather data is used for. Options: 'Wind',
+        'Solar'.
+
+    Returns
+    -------
+    weather_df : pd.DataFrame
+        Weather data in the format needed by the feedinlib for `category`.
+
+    """
+    if category == 'Solar':
+        # todo delete the following lines when weather is integrated in feedinlib, + year input in feedinlib
+        weather_df = pd.read_csv(filename, skiprows=range(1, 50), nrows=(5000),
+                                 index_col=0)
+        weather_df.index = pd.to_datetime(weather_df.index,
+                                          utc=True).tz_convert(
+            'Europe/Berlin')
+        # calculate ghi
+        weather_df['ghi'] = weather_df.dirhi + weather_df.dhi
+        weather_df = weather_df.dropna()
+    elif category == 'Wind':
+        weather_df = tools.example_weather_wind(filename)
+    else:
+        raise ValueError("No weather data for category {}. ".format(
+            category) + "Choose from: 'Wind', 'Solar'.")
+    return weather_df
+
+
+def get_weather_store(category, year, filename=None, overwrite=False):
+    r"""
+    Returns the path of the weather store of `category` and `year`.
+
+    The store is created from the csv file if it does not exist. It is keyed
+    by the path, size and modification time of the csv file, `year` and the
+    store version in feedin_germany.ini, so that a changed file results in a
+    new store.
+
+    Parameters
+    ----------
+    category : string
+        Energy source category the weather data is used for. Options: 'Wind',
+        'Solar'.
+    year : int
+        Year of the weather data. If the file contains data of `year` only
+        this data is stored, otherwise all data of the file.
+    filename : string or None
+        Path to the open_FRED csv file. If None the file of `category` in
+        section 'weather' of feedin_germany.ini is used. Default: None.
+    overwrite : boolean
+        If True the store is created again. Default: False.
+
+    Returns
+    -------
+    path : string
+        Directory of the weather store.
+
+    """
+    if filename is None:
+        filename = get_weather_filename(category)
+    path = get_weather_store_path(category, year, filename=filename)
+    if overwrite or not os.path.isdir(path):
+        logging.info("Creating weather store {} from {}.".format(path,
+                                                                 filename))
+        weather_df = read_open_fred_csv(filename, category)
+        times = weather_df.index.get_level_values(0)
+        if (times.year == year).any():
+            weather_df = weather_df.loc[times.year == year]
+        else:
+            logging.warning("No weather data of {} in {}. ".format(
+                year, filename) + "All data of the file is used.")
+        write_weather_store(weather_df, path)
+    return path
+
+
+def get_weather_store_path(category, year, filename=None):
+    r"""
+    Returns the directory of the weather store of `category` and `year`.
+
+    The directory is keyed by the path, size and modification time of the csv
+    file, `year` and the store version in feedin_germany.ini. The store is not
+    created (see :py:func:`get_weather_store`).
+
+    Parameters
+    ----------
+    category : string
+        Energy source category the weather data is used for. Options: 'Wind',
+        'Solar'.
+    year : int
+        Year of the weather data.
+    filename : string or None
+        Path to the open_FRED csv file. If None the file of `category` in
+        section 'weather' of feedin_germany.ini is used. Default: None.
+
+    Returns
+    -------
+    path : string
+        Directory of the weather store.
+
+    """
+    if filename is None:
+        filename = get_weather_filename(category)
+    stat = os.stat(filename)
+    key = hashlib.sha1(json.dumps([
+        filename, stat.st_size, stat.st_mtime, category, year,
+        cfg.get('weather', 'store_version')]).encode('utf-8')).hexdigest()
+    return os.path.join(os.path.dirname(__file__), cfg.get('paths', 'weather'),
+                        '{}_{}_{}'.format(category.lower(), year, key[:16]))
+
+
+def write_weather_store(weather_df, path):
+    r"""
+    Writes weather data to a weather store.
+
+    Parameters
+    ----------
+    weather_df : pd.DataFrame
+        Weather data with datetime index or MultiIndex (time, lat, lon). Data
+        with datetime index and the location in columns 'lat' and 'lon' (one
+        row per time and location, like solar weather data) is stored with
+        the location in the index (see :py:func:`locations_to_columns`).
+    path : string
+        Directory of the weather store. Existing stores are replaced.
+
+    """
+    if (not isinstance(weather_df.index, pd.MultiIndex) and
+            {'lat', 'lon'}.issubset(weather_df.columns)):
+        # the coordinates are stored as float64 locations instead of float32
+        # values of every row
+        weather_df = weather_df.set_index(['lat', 'lon'], append=True)
+    if isinstance(weather_df.index, pd.MultiIndex):
+        times = weather_df.index.get_level_values(0).unique()
+        locations = weather_df.index.droplevel(0).unique()
+        time_codes = times.get_indexer(weather_df.index.get_level_values(0))
+        location_codes = locations.get_indexer(weather_df.index.droplevel(0))
+        location_values = [list(location) for location in locations]
+    else:
+        times = weather_df.index
+        time_codes = np.arange(len(times))
+        location_codes = np.zeros(len(times), dtype=int)
+        location_values = None
+    n_locations = 1 if location_values is None else len(location_values)
+    metadata = {
+        'tz': None if times.tz is None else str(times.tz),
+        'index_names': list(weather_df.index.names),
+        'locations': location_values,
+        'columns': [[_to_python(value) for value in column]
+                    if isinstance(column, tuple) else _to_python(column)
+                    for column in weather_df.columns],
+        'column_names': list(weather_df.columns.names),
+        'shape': [len(times), n_locations, len(weather_df.columns)]}
+
+    with file_tools.write_atomically(path) as tmp_path:
+        os.makedirs(tmp_path)
+        values = np.lib.format.open_memmap(
+            os.path.join(tmp_path, 'values.npy'), mode='w+',
+            dtype=np.float32, shape=tuple(metadata['shape']))
+        # missing (time, location) combinations are nan
+        values[:] = np.nan
+        values[time_codes, location_codes, :] = weather_df.values
+        values.flush()
+        del values
+        if times.tz is not None:
+            times = times.tz_convert('UTC').tz_localize(None)
+        np.save(os.path.join(tmp_path, 'times.npy'), times.values)
+        with open(os.path.join(tmp_path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+
+def _to_python(value):
+    # numpy scalars (for example heights) cannot be written to json
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def open_weather_store(path):
+    r"""
+    Opens a weather store memory-mapped.
+
+    Parameters
+    ----------
+    path : string
+        Directory of the weather store.
+
+    Returns
+    -------
+    weather_df : pd.DataFrame
+        Weather data (float32) as written by :py:func:`write_weather_store`.
+        The values are backed by the memory-mapped file and read-only.
+
+    """
+    # the store may be replaced by another process meanwhile (see
+    # file_tools.write_atomically), then the new version is opened
+    for attempt in range(3):
+        try:
+            metadata, values, times = _load_weather_store_files(
+                os.path.realpath(path))
+            break
+        except FileNotFoundError:
+            if attempt == 2 or not os.path.isdir(path):
+                raise
+    n_times, n_locations, n_variables = metadata['shape']
+    if metadata['tz'] is not None:
+        times = times.tz_localize('UTC').tz_convert(metadata['tz'])
+
+    if metadata['locations'] is None:
+        index = times
+        index.name = metadata['index_names'][0]
+    else:
+        locations = np.array(metadata['locations'])
+        levels, codes = [times], [np.repeat(np.arange(n_times), n_locations)]
+        for location_values in locations.T:
+            level, level_codes = np.unique(location_values,
+                                           return_inverse=True)
+            levels.append(level)
+            codes.append(np.tile(level_codes, n_times))
+        index = pd.MultiIndex(levels=levels, codes=codes,
+                              names=metadata['index_names'],
+                              verify_integrity=False)
+
+    if isinstance(metadata['columns'][0], list):
+        columns = pd.MultiIndex.from_tuples(
+            [tuple(column) for column in metadata['columns']],
+            names=metadata['column_names'])
+    else:
+        columns = pd.Index(metadata['columns'],
+                           name=metadata['column_names'][0])
+    return pd.DataFrame(values.reshape(n_times * n_locations, n_variables),
+                        index=index, columns=columns, copy=False)
+
+
+def locations_to_columns(weather_df):
+    r"""
+    Moves the location of weather data into the columns 'lat' and 'lon'.
+
+    This is the format of the solar weather data needed by the feedinlib
+    (see :py:func:`read_open_fred_csv`).
+
+    Parameters
+    ----------
+    weather_df : pd.DataFrame
+        Weather data with MultiIndex (time, lat, lon) as returned by
+        :py:func:`open_weather_store`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Weather data with datetime index and one row per time and location.
+        Rows with missing values are dropped.
+
+    """
+    return weather_df.reset_index(level=['lat', 'lon']).dropna()
+
+
+def _load_weather_store_files(path):
+    with open(os.path.join(path, 'metadata.json')) as f:
+        metadata = json.load(f)
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    times = pd.DatetimeIndex(np.load(os.path.join(path, 'times.npy')))
+    return metadata, values, times
+
+
+def load_weather(category, year, filename=None):
+    r"""
+    Loads the open_FRED weather data of `category` and `year`.
+
+    The weather data is read from a weather store, which is created from the
+    csv file at the first call (see :py:func:`get_weather_store`).
+
+    Parameters
+    ----------
+    category : string
+        Energy source category the weather data is used for. Options: 'Wind',
+        'Solar'.
+    year : int
+        Year of the weather data.
+    filename : string or None
+        Path to the open_FRED csv file. If None the file of `category` in
+        section 'weather' of feedin_germany.ini is used. Default: None.
+
+    Returns
+    -------
+    weather_df : pd.DataFrame
+        Weather data in the format needed by the feedinlib for `category`.
+
+    """
+    return open_weather_store(get_weather_store(category, year,
+                                                filename=filename))
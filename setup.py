@@ -18,4 +18,6 @@ setup(
     long_description=read('README.rst'),
     install_requires=[
         'pandas >= 0.13.1',
+        'shapely >= 2.0',
+        'pyarrow >= 10.0',
         'feedinlib >= 0.0.12']) # todo: adapt
\ No newline at end of file